@@ -0,0 +1,120 @@
+"""Command line conversion between SCS showfiles and LiSP sessions.
+
+    python -m lisp2scs convert show.scs11 show.lsp
+    python -m lisp2scs convert show.lsp show.scs11
+    python -m lisp2scs convert --jobs 8 archive/ converted/
+    python -m lisp2scs convert --package show.lsp transfer/show.scs11
+    python -m lisp2scs check show.scs11
+
+When given a directory, every SCS showfile and LiSP session within it is
+converted, using a pool of processes. A single SCS showfile has its cues
+converted by a pool of processes only if ``--jobs`` is given.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import os
+import sys
+
+from .headless import LISP_FILE_EXT, check_file, convert_file, destination_path
+from .util import SCS_FILE_EXT
+
+
+logger = logging.getLogger("lisp2scs") # pylint: disable=invalid-name
+
+
+def convert_directory(source_dir, destination_dir, jobs, package, link):
+    os.makedirs(destination_dir, exist_ok=True)
+
+    sources = sorted(
+        os.path.join(source_dir, filename)
+        for filename in os.listdir(source_dir)
+        if filename.endswith((SCS_FILE_EXT, LISP_FILE_EXT))
+    )
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            # Each file is converted within a single process, as there's already one per core
+            pool.submit(
+                convert_file, source, destination_path(source, destination_dir, package),
+                package, link, 1
+            ): source
+            for source in sources
+        }
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                count = future.result()
+            except Exception as exception: # pylint: disable=broad-except
+                logger.error(f"{source}: {exception}")
+                failures += 1
+                continue
+            logger.info(f"{source}: {count} cues converted")
+
+    logger.info(f"Converted {len(sources) - failures} of {len(sources)} files.")
+    return failures == 0
+
+
+def check(source, stop_early):
+    prescan = check_file(source, stop_early)
+    logger.info(f"{source}: {prescan.cue_count} cues, {len(prescan.media_files)} media files")
+
+    unsupported = sorted(subtype for subtype, ok in prescan.subtypes.items() if not ok)
+    if unsupported:
+        logger.error(f"{source}: unsupported SubTypes: {', '.join(unsupported)}")
+    if prescan.error:
+        logger.error(f"{source}: malformed: {prescan.error}")
+    return prescan.passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lisp2scs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser(
+        "convert", help="convert between SCS showfiles and LiSP sessions")
+    convert.add_argument("source", help="file or directory to convert")
+    convert.add_argument("destination", help="file or directory to write to")
+    convert.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="number of processes to use (default: one per core for a directory, "
+             "otherwise one)")
+    convert.add_argument(
+        "--package", action="store_true",
+        help="when exporting to SCS, also gather the media files used beside the showfile")
+    convert.add_argument(
+        "--link", action="store_true",
+        help="when packaging, hard-link media files rather than copying them, where possible")
+
+    check_parser = subparsers.add_parser(
+        "check", help="check whether an SCS showfile may be converted, without converting it")
+    check_parser.add_argument("source", help="SCS showfile to check")
+    check_parser.add_argument(
+        "--stop-early", action="store_true", help="stop at the first problem found")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if args.command == "check":
+        return 0 if check(args.source, args.stop_early) else 1
+
+    if os.path.isdir(args.source):
+        succeeded = convert_directory(
+            args.source, args.destination, args.jobs, args.package, args.link)
+        return 0 if succeeded else 1
+
+    try:
+        count = convert_file(
+            args.source, args.destination, args.package, args.link, args.jobs or 1)
+    except Exception as exception: # pylint: disable=broad-except
+        logger.error(f"{args.source}: {exception}")
+        return 1
+
+    logger.info(f"{args.source}: {count} cues converted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""Benchmarks of importing and exporting, using generated SCS showfiles.
+
+    python -m lisp2scs.benchmark --cues 2000 --mix F=4,A=1,M=4,P=1
+    python -m lisp2scs.benchmark --cues 500 --playlist-entries 20 --json results.json
+
+A showfile with the requested number and mix of cues is generated from a
+fixed seed, so that the same arguments always produce the same file and
+results may be compared between releases. Each stage is timed over a
+number of runs, with the peak memory of each stage measured on a separate
+run (as tracing memory allocations slows things down).
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.sax.saxutils import escape
+
+from .headless import HeadlessScsExporter, HeadlessScsImporter, StubApplication
+from .util import SCS_FILE_EXT, SCS_FILE_REL_PREFIX, SCS_XML_INDENT
+
+
+DEFAULT_MIX = "F=4,A=1,M=4,P=1"
+
+WORDS = (
+    "actor", "blackout", "cross", "door", "enter", "exit", "fade", "light",
+    "music", "phone", "rain", "sound", "stage", "thunder", "wait", "window",
+)
+
+
+def parse_mix(mix):
+    """Parses a mix such as "F=4,A=1" into a mapping of SubType to weight."""
+    weights = {}
+    for part in mix.split(","):
+        subtype, weight = part.split("=")
+        weights[subtype.strip()] = int(weight)
+    return weights
+
+
+class ShowfileGenerator:
+    """Generates synthetic SCS showfiles."""
+
+    def __init__(self, seed=0, playlist_entries=5, whenreqd_length=0):
+        self._random = random.Random(seed)
+        self._playlist_entries = playlist_entries
+        self._whenreqd_length = whenreqd_length
+
+    def _text(self, length):
+        words = []
+        while sum(len(word) + 1 for word in words) < length:
+            words.append(self._random.choice(WORDS))
+        text = " ".join(words)[:length]
+        # Break long text into lines, as a user would
+        return "\n".join(text[i:i + 80] for i in range(0, len(text), 80))
+
+    def _field(self, depth, tag, value):
+        return f"{SCS_XML_INDENT * depth}<{tag}>{escape(str(value))}</{tag}>\n"
+
+    def _file_name(self, ext):
+        return f"{SCS_FILE_REL_PREFIX}media\\{self._random.randrange(10000):04d}.{ext}"
+
+    def _sub_audio(self, depth):
+        return [
+            self._field(depth, "SubType", "F"),
+            f"{SCS_XML_INDENT * depth}<AudioFile>\n",
+            self._field(depth + 1, "FileName", self._file_name("wav")),
+            self._field(depth + 1, "LogicalDev0", "System"),
+            self._field(depth + 1, "DBLevel0", round(self._random.uniform(-30, 0), 2)),
+            self._field(depth + 1, "Pan0", self._random.randrange(1001)),
+            self._field(depth + 1, "FadeInTime", self._random.randrange(5000)),
+            f"{SCS_XML_INDENT * depth}</AudioFile>\n",
+        ]
+
+    def _sub_video(self, depth):
+        return [
+            self._field(depth, "SubType", "A"),
+            self._field(depth, "SubDBLevel0", round(self._random.uniform(-30, 0), 2)),
+            self._field(depth, "PLFadeInTime", self._random.randrange(5000)),
+            f"{SCS_XML_INDENT * depth}<VideoFile>\n",
+            self._field(depth + 1, "FileName", self._file_name("mp4")),
+            f"{SCS_XML_INDENT * depth}</VideoFile>\n",
+        ]
+
+    def _sub_midi(self, depth):
+        return [
+            self._field(depth, "SubType", "M"),
+            f"{SCS_XML_INDENT * depth}<ControlMessage>\n",
+            self._field(depth + 1, "CMLogicalDev", "MIDI"),
+            self._field(depth + 1, "MSMsgType", "CC"),
+            self._field(depth + 1, "MSChannel", self._random.randrange(1, 17)),
+            self._field(depth + 1, "MSParam1", self._random.randrange(128)),
+            self._field(depth + 1, "MSParam2", self._random.randrange(128)),
+            f"{SCS_XML_INDENT * depth}</ControlMessage>\n",
+        ]
+
+    def _sub_playlist(self, depth):
+        lines = [
+            self._field(depth, "SubType", "P"),
+            self._field(depth, "PLMastDBLevel0", round(self._random.uniform(-30, 0), 2)),
+        ]
+        for _ in range(self._playlist_entries):
+            lines += [
+                f"{SCS_XML_INDENT * depth}<Sub>\n",
+                self._field(depth + 1, "FileName", self._file_name("wav")),
+                self._field(depth + 1, "PLRelLevel", self._random.randrange(1, 101)),
+                f"{SCS_XML_INDENT * depth}</Sub>\n",
+            ]
+        return lines
+
+    def write(self, file, cue_count, mix):
+        builders = {
+            "F": self._sub_audio,
+            "A": self._sub_video,
+            "M": self._sub_midi,
+            "P": self._sub_playlist,
+        }
+        subtypes = list(mix)
+        weights = [mix[subtype] for subtype in subtypes]
+
+        file.write('<?xml version="1.0" ?>\n<Production>\n')
+        file.write(f"{SCS_XML_INDENT}<Head>\n")
+        file.write(self._field(2, "Title", "Benchmark"))
+        file.write(f"{SCS_XML_INDENT}</Head>\n")
+
+        for idx in range(cue_count):
+            subtype = self._random.choices(subtypes, weights)[0]
+            lines = [
+                f"{SCS_XML_INDENT}<Cue>\n",
+                self._field(2, "CueID", f"Q{idx + 1}"),
+                self._field(2, "Description", " ".join(self._random.choices(WORDS, k=3))),
+            ]
+            if self._whenreqd_length:
+                lines.append(self._field(2, "WhenReqd", self._text(self._whenreqd_length)))
+            lines.append(f"{SCS_XML_INDENT * 2}<Sub>\n")
+            lines += builders[subtype](3)
+            lines.append(f"{SCS_XML_INDENT * 2}</Sub>\n")
+            lines.append(f"{SCS_XML_INDENT}</Cue>\n")
+            file.write("".join(lines))
+
+        file.write("</Production>\n")
+
+
+def measure(stage, runs):
+    """Times a stage over a number of runs, then measures its peak memory on one more."""
+    timings = []
+    for _ in range(runs):
+        task = stage()
+        start = time.perf_counter()
+        task()
+        timings.append(time.perf_counter() - start)
+
+    task = stage()
+    tracemalloc.start()
+    try:
+        task()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "peak_memory": peak,
+    }
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    results = {
+        "cues": args.cues,
+        "mix": args.mix,
+        "playlist_entries": args.playlist_entries,
+        "whenreqd_length": args.whenreqd_length,
+        "seed": args.seed,
+        "runs": args.runs,
+        "workers": args.workers,
+        "python": sys.version.split()[0],
+        "stages": {},
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, f"benchmark{SCS_FILE_EXT}")
+        with open(source, mode="w", encoding="utf-8") as file:
+            ShowfileGenerator(args.seed, args.playlist_entries, args.whenreqd_length).write(
+                file, args.cues, mix)
+        results["file_size"] = os.path.getsize(source)
+
+        # Each stage returns the function to be timed, having done any setup
+        # that isn't part of what's being measured.
+        def parse_stage():
+            importer = HeadlessScsImporter(StubApplication())
+            def parse():
+                with open(source, mode="rb") as file_contents:
+                    return importer.parse_file(file_contents, work_dir, workers=args.workers)
+            return parse
+
+        importer = HeadlessScsImporter(StubApplication())
+        showfile = parse_stage()()
+
+        def validate_stage():
+            return lambda: importer.validate_file(showfile)
+
+        def import_stage():
+            stage_importer = HeadlessScsImporter(StubApplication())
+            return lambda: stage_importer.import_file(showfile)
+
+        app = StubApplication(os.path.join(work_dir, "benchmark.lsp"))
+        HeadlessScsImporter(app).import_file(showfile)
+        session_dict = {
+            "cues": [
+                dict(cue.properties(), index=index) for index, cue in enumerate(app.cue_model)
+            ],
+        }
+
+        def export_stage():
+            # A new exporter each time, so nothing is reused from a previous run
+            exporter = HeadlessScsExporter(StubApplication(app.session.session_file))
+            snapshot = exporter.snapshot_session(session_dict)
+            return lambda: exporter.export(None, snapshot, io.StringIO())
+
+        stages = {
+            "parse_file": parse_stage,
+            "validate_file": validate_stage,
+            "import_file": import_stage,
+            "export": export_stage,
+        }
+        for name, stage in stages.items():
+            results["stages"][name] = measure(stage, args.runs)
+
+    return results
+
+
+def report(results):
+    print(f"{results['cues']} cues ({results['mix']}), "
+          f"{results['file_size'] / 1024:.1f} KiB, best/median of {results['runs']} runs")
+    for name, stage in results["stages"].items():
+        throughput = results["cues"] / stage["min"] if stage["min"] else float("inf")
+        print(f"  {name:<14} {stage['min'] * 1000:9.2f} ms  {stage['median'] * 1000:9.2f} ms  "
+              f"{throughput:12.0f} cues/s  {stage['peak_memory'] / 1024:10.1f} KiB peak")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lisp2scs.benchmark")
+    parser.add_argument("--cues", type=int, default=1000, help="number of cues to generate")
+    parser.add_argument(
+        "--mix", default=DEFAULT_MIX,
+        help=f"relative weights of each SCS SubType (default: {DEFAULT_MIX})")
+    parser.add_argument(
+        "--playlist-entries", type=int, default=5, help="number of entries in each playlist")
+    parser.add_argument(
+        "--whenreqd-length", type=int, default=0,
+        help="length of each cue's WhenReqd text (default: none)")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of processes to convert cues with when parsing (default: 1)")
+    parser.add_argument("--runs", type=int, default=5, help="number of timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0, help="seed for generating the showfile")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    report(results)
+
+    if args.json:
+        with open(args.json, mode="w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
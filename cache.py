@@ -0,0 +1,147 @@
+
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import pickle
+from threading import Lock
+
+from .util import user_cache_dir
+
+
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
+SHOWFILE_CACHE_DIR = "showfiles"
+SHOWFILE_CACHE_SIZE = 256 * 1024 * 1024 # bytes
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# To be increased whenever what's cached - or how a showfile is read into
+# it - changes, so that entries written by an earlier version are unused.
+SHOWFILE_CACHE_VERSION = 1
+
+
+class LruCache:
+    """A bounded mapping, discarding the least recently used entries once full.
+
+    Safe to use from more than one thread.
+    """
+
+    def __init__(self, maxsize):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+class ShowfileCache:
+    """Keeps the records read from SCS showfiles, so an unchanged file need not be parsed again.
+
+    Entries are keyed by a hash of the showfile's content, and are pickled
+    to a file each. Once their total size exceeds the limit, the least
+    recently used are removed.
+    """
+
+    def __init__(self, cache_dir=None, max_size=SHOWFILE_CACHE_SIZE):
+        self._cache_dir = cache_dir or os.path.join(user_cache_dir(), SHOWFILE_CACHE_DIR)
+        self._max_size = max_size
+
+    def _entry_path(self, key):
+        return os.path.join(self._cache_dir, f"{key}.pickle")
+
+    def key(self, file_contents):
+        """The key of an open showfile. The file is left positioned where it was found."""
+        start = file_contents.tell()
+        digest = hashlib.blake2b(f"{SHOWFILE_CACHE_VERSION}:".encode(), digest_size=20)
+        for chunk in iter(lambda: file_contents.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        file_contents.seek(start)
+        return digest.hexdigest()
+
+    def load(self, key):
+        """Returns the records kept for the given key, or None if there are none."""
+        path = self._entry_path(key)
+        try:
+            with open(path, mode="rb") as file:
+                records = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as exception: # pylint: disable=broad-except
+            logger.warning(f"Discarding unreadable cached showfile {path}: {exception}")
+            self._remove(path)
+            return None
+
+        try:
+            # Marks the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return records
+
+    def save(self, key, records):
+        """Keeps the records read from a showfile, under the given key."""
+        path = self._entry_path(key)
+        partial_path = f"{path}.{os.getpid()}.part"
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(partial_path, mode="wb") as file:
+                pickle.dump(records, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial_path, path)
+        except OSError as exception:
+            logger.warning(f"Unable to cache showfile to {path}: {exception}")
+            self._remove(partial_path)
+            return
+        self._trim()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _trim(self):
+        entries = []
+        try:
+            with os.scandir(self._cache_dir) as scan:
+                for entry in scan:
+                    if entry.name.endswith(".pickle"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        # Newest first, so that the oldest are those removed once over the limit
+        entries.sort(reverse=True)
+        total = 0
+        for _, size, path in entries:
+            total += size
+            if total > self._max_size:
+                self._remove(path)
@@ -0,0 +1,49 @@
+
+# pylint: disable=import-error
+from lisp.core.plugin import PluginNotLoadedError
+from lisp.plugins import get_plugin
+
+from .util import ScsDeviceType
+
+
+class ScsBackendContext:
+    """What LiSP's media backend supports, resolved once per import or export.
+
+    Asking the backend is relatively costly (GStreamer's registry is
+    consulted to find the supported file extensions), so it is done once at
+    the start of a run, and the answers shared by all importers or exporters.
+    """
+
+    __slots__ = ("audio_extensions", "video_extensions", "sink_element")
+
+    def __init__(self, audio_extensions=(), video_extensions=(), sink_element=None):
+        self.audio_extensions = frozenset(audio_extensions)
+        self.video_extensions = frozenset(video_extensions)
+        self.sink_element = sink_element
+
+    @classmethod
+    def from_backend(cls):
+        try:
+            backend = get_plugin("GstBackend")
+        except PluginNotLoadedError:
+            return cls()
+
+        if not backend.is_loaded():
+            return cls()
+
+        extensions = backend.supported_extensions()
+        return cls(
+            audio_extensions=extensions["audio"],
+            video_extensions=extensions["video"],
+            sink_element=backend.Config.get("pipeline")[-1],
+        )
+
+    def media_type(self, extension):
+        """Whether a file with the given extension is to be treated as audio or video."""
+        # The backend lists its extensions in lower case
+        extension = extension.lower()
+        if extension in self.audio_extensions:
+            return ScsDeviceType.Audio
+        if extension in self.video_extensions:
+            return ScsDeviceType.VideoAudio
+        return None
@@ -1,26 +1,62 @@
 
+import io
 import logging
-
-from xml.dom.minidom import getDOMImplementation
+import shutil
+import tempfile
 
 from lisp.core.plugin import PluginNotLoadedError
 from lisp.plugins import get_plugin
 
+try:
+    from lisp.plugins.controller.common import LayoutAction
+except ImportError:
+    LayoutAction = None
+
+from .cache import LruCache
+from .context import ScsBackendContext
 from .exporters import find_exporters
-from .util import CUEID_MARKUP_PREFIX, CUEID_MARKUP_SUFFIX, ExportKeys, ScsAudioDevice, ScsDeviceType, SCS_XML_INDENT
+from .midi_codec import decode_midi
+from .packaging import MediaPackager
+from .probe import MediaProber
+from .timing import NullTimings
+from .util import (
+    ExportKeys,
+    ScsAudioDevice,
+    ScsCueIndex,
+    ScsCueSnapshot,
+    ScsDeviceType,
+    ScsExportSnapshot,
+)
+from .writer import ScsElement, ScsXmlWriter
 
 
 logger = logging.getLogger(__name__) # pylint: disable=invalid-name
 
+# The number of cues whose rendered XML is kept between exports.
+FRAGMENT_CACHE_SIZE = 4096
+
+# The properties of every cue that are exported, whatever its type. Those
+# particular to a type are given by its exporter's `exported_properties`.
+GENERIC_CUE_PROPERTIES = ("_type_", "name", "description")
+
 
 class ScsExporter:
 
-    def __init__(self, app):
+    def __init__(self, app, timings=None):
 
         self._app = app
-        self._impl = getDOMImplementation()
-        self._dom = None
         self._prod_id = None
+        self._snapshot = None
+        self._cue_index = None
+        self._prober = None
+        self.timings = timings or NullTimings()
+
+        # Rendered <Cue>s of previously exported cues, by LiSP cue id, so
+        # only cues that have changed need be exported again.
+        self._fragments = LruCache(FRAGMENT_CACHE_SIZE)
+        cue_model = getattr(app, "cue_model", None)
+        if cue_model is not None:
+            cue_model.item_removed.connect(self._cue_removed)
 
         # Find exporters (but don't init them)
         self._exporters = {}
@@ -33,69 +69,230 @@ class ScsExporter:
             logger.debug(f"Registering exporter for {cuetype}: {name}.")
             self._exporters[cuetype] = exporter
 
-    @property
-    def dom(self):
-        return self._dom
+    def _cue_removed(self, lisp_cue):
+        self._fragments.discard(lisp_cue.id)
+
+    def _export_fragment(self, lisp_cue):
+        """Returns the rendered <Cue>s of a cue, along with the device it uses.
 
-    def _split_cue_name(self, lisp_cue):
+        If the cue is unchanged since it was last exported, the previous
+        rendering is reused.
         """
-        See comment for CUEID_MARKUP_PREFIX in util.py
+        cue_type = lisp_cue.cuetype
+        exporter = self._exporters[cue_type]
+
+        cue_id = lisp_cue.get("id")
+        # The SCS CueID is included, as it may change whilst the cue doesn't
+        fingerprint = (
+            lisp_cue.fingerprint(GENERIC_CUE_PROPERTIES + exporter.exported_properties),
+            self._cue_index.cue_id(lisp_cue),
+        )
+        cached = self._fragments.get(cue_id)
+        if cached is not None and cached[0] == fingerprint:
+            self.timings.add("convert.cached", 0.0)
+            return cached[1]
+
+        with self.timings.stage(f"convert.{exporter.__class__.__name__}"):
+            exported = exporter.export_cue(self, lisp_cue)
+        if not exported:
+            logger.warning(f"{cue_type} '{lisp_cue.name}' not exported.")
+            return None
+
+        rendered = io.StringIO()
+        writer = ScsXmlWriter(rendered)
+        with self.timings.stage("serialize"):
+            for scs_cue in exported[ExportKeys.Cues]:
+                writer.write_element(scs_cue)
+
+        fragment = (rendered.getvalue(), exported.get(ExportKeys.Device))
+        if cue_id is not None:
+            self._fragments.put(cue_id, (fingerprint, fragment))
+        return fragment
+
+    def init_exporter(self, cuetype):
+        """Initialises the exporter needed for the given cue type, if not already."""
+        # Check we have an exporter for the cue type
+        if cuetype not in self._exporters:
+            logger.warning(f"No registered exporter for Cues of type {cuetype}")
+            return
+
+        # And if we do, initialise an instance of it, if needed
+        if isinstance(self._exporters[cuetype], type):
+            self._exporters[cuetype] = self._exporters[cuetype]()
+
+    @property
+    def context(self):
+        """What the media backend supports, as resolved when the snapshot was taken."""
+        return self._snapshot.backend
+
+    @property
+    def prober(self):
+        if self._prober is None:
+            self._prober = MediaProber()
+        return self._prober
+
+    @property
+    def session_dir(self):
+        return self._snapshot.session_dir
+
+    def create_backend_context(self):
+        return ScsBackendContext.from_backend()
+
+    @property
+    def cue_index(self):
+        """The SCS CueID and name of each cue, as worked out at the start of the export."""
+        return self._cue_index
+
+    def _get_midi_controls(self):
+        try:
+            midi = get_plugin("Midi")
+            controller = get_plugin("Controller")
+        except PluginNotLoadedError:
+            return None
+
+        if not midi.is_loaded() or not controller.is_loaded():
+            return None
+
+        return controller.Config.get('protocols.midi', None)
+
+    def _midi_output_available(self):
+        try:
+            return get_plugin("Midi").is_loaded()
+        except PluginNotLoadedError:
+            return False
+
+    def package_media(self, snapshot, target_dir, link=False, report_progress=None):
+        """Gathers the media files of a snapshot's cues into the given folder.
+
+        The cues are pointed at the gathered copies, so this needs to be done
+        before the snapshot is exported (into the same folder). If `link` is
+        True, files are hard-linked rather than copied where possible.
         """
-        cue_id = lisp_cue.index + 1
-        cue_name = lisp_cue.name
-        if cue_name.startswith(CUEID_MARKUP_PREFIX):
-            cue_name_split = cue_name[len(CUEID_MARKUP_PREFIX):].split(CUEID_MARKUP_SUFFIX, 1)
-            if len(cue_name_split) == 2:
-                    cue_name = cue_name_split[1]
-                    if cue_name_split[0].isalnum():
-                        cue_id = cue_name_split[0]
-        return cue_id, cue_name
-
-    def export(self, prod_id, cues):
-
-        # Get used cue types
-        cuetypes = {cue.__class__.__name__ for cue in self._app.layout.cues()}
-
-        for cuetype in cuetypes:
-            # Check we have an exporter for each cue type
-            if cuetype not in self._exporters:
-                logger.warning(f"No registered exporter for Cues of type {cuetype}")
-                continue
+        self._snapshot = snapshot
+        packager = MediaPackager(target_dir, link)
+
+        with self.timings.stage("package", 0):
+            for exporter in self._exporters.values():
+                if not isinstance(exporter, type) and hasattr(exporter, "package_media"):
+                    exporter.package_media(self, snapshot.cues, packager)
+
+            packager.copy_all(report_progress)
 
-            # And if we do, initialise an instance of it, if needed
-            if isinstance(self._exporters[cuetype], type):
-                self._exporters[cuetype] = self._exporters[cuetype]()
+    def snapshot(self, cues):
+        """Copies what is needed to export the given cues.
 
+        Only the cues given are exported, so these may be all the cues of
+        the layout, or just some of them. This needs to be called on the GUI
+        thread. The export itself may then be run from the returned snapshot
+        on any thread.
+        """
+
+        self.timings.reset()
+
+        cuetypes = set()
+        cue_snapshots = []
+        with self.timings.stage("snapshot", 0):
+            for lisp_cue in cues:
+                cue_snapshot = ScsCueSnapshot.from_cue(lisp_cue)
+                if cue_snapshot.cuetype not in cuetypes:
+                    cuetypes.add(cue_snapshot.cuetype)
+                    self.init_exporter(cue_snapshot.cuetype)
+
+                exporter = self._exporters.get(cue_snapshot.cuetype)
+                if hasattr(exporter, "snapshot_cue"):
+                    cue_snapshot.extras.update(exporter.snapshot_cue(lisp_cue))
+                cue_snapshots.append(cue_snapshot)
+            self.timings.add("snapshot", 0.0, len(cue_snapshots))
+
+        return ScsExportSnapshot(
+            title=self._app.session.name(),
+            session_dir=self._app.session.dir(),
+            cues=cue_snapshots,
+            backend=self.create_backend_context(),
+            midi_output=self._midi_output_available(),
+            midi_controls=self._get_midi_controls(),
+        )
+
+    def export(self, prod_id, snapshot, file, report_progress=None):
+        """Writes an SCS showfile of the cues within a snapshot to a text file.
+
+        Each cue is written out as soon as it has been converted, so at most
+        one cue's worth of XML is held in memory at any one time. If given,
+        `report_progress` is called with the number of cues exported so far,
+        and the total number to be exported.
+
+        Returns the number of cues written, which is fewer than the number
+        in the snapshot if any could not be exported.
+        """
         self._prod_id = prod_id
-        self._dom = self._impl.createDocument(None, "Production", None)
+        self._snapshot = snapshot
 
         devices = {}
         for devtype in ScsDeviceType:
             devices[devtype] = set()
 
-        document = self._dom.documentElement
+        total = len(snapshot.cues)
+        written = 0
+
+        with self.timings.stage("index", total):
+            self._cue_index = ScsCueIndex(snapshot.cues)
+        if self._cue_index.renumbered:
+            logger.warning(
+                "The following CueIDs are used by more than one cue, so have been renumbered:\n"
+                + "\n".join(f"{old} -> {new}" for old, new in self._cue_index.renumbered))
+
+        # Give exporters the chance to gather what they need about all
+        # their cues at once, rather than cue by cue.
+        with self.timings.stage("prepare", 0):
+            for exporter in self._exporters.values():
+                if not isinstance(exporter, type) and hasattr(exporter, "prepare_export"):
+                    exporter.prepare_export(self, snapshot.cues)
+
+        # The <Head> comes first in the file, but cannot be built until we
+        # know which devices the cues use. So the cues are written out to
+        # a spool file, to be copied in after the <Head>.
+        with tempfile.TemporaryFile(mode="w+", encoding="utf-8") as spool:
+            for done, lisp_cue in enumerate(snapshot.cues, start=1):
+                cue_type = lisp_cue.cuetype
+                if cue_type not in self._exporters or isinstance(self._exporters[cue_type], type):
+                    # A warning has already been given if no appropriate exporter is present
+                    continue
+
+                fragment = self._export_fragment(lisp_cue)
+                if fragment is None:
+                    continue
 
-        for lisp_cue in cues:
-            cue_type = lisp_cue.__class__.__name__
-            if cue_type not in self._exporters:
-                # A warning has already been given if no appropriate exporter is present
-                continue
+                rendered, device = fragment
+                with self.timings.stage("serialize", 0):
+                    spool.write(rendered)
+                written += 1
 
-            exported = self._exporters[cue_type].export_cue(self, lisp_cue)
-            if not exported:
-                logger.warning(f"{cue_type} '{lisp_cue.name}' not exported.")
-                continue
+                if device:
+                    device_type, device_details = device
+                    devices[device_type].add(device_details)
 
-            for scs_cue in exported[ExportKeys.Cues]:
-                document.appendChild(scs_cue)
+                if report_progress:
+                    report_progress(done, total)
+
+            with self.timings.stage("head"):
+                head = self.build_production_head(devices)
 
-            if ExportKeys.Device in exported:
-                device_type, device_details = exported[ExportKeys.Device]
-                devices[device_type].add(device_details)
+            with self.timings.stage("serialize", 0):
+                writer = ScsXmlWriter(file)
+                writer.start_document("Production")
+                writer.write_element(head)
 
-        document.insertBefore(self.build_production_head(devices), document.firstChild)
+                spool.seek(0)
+                shutil.copyfileobj(spool, file)
+                writer.end_document()
 
-        return self._dom
+        self._snapshot = None
+        self._cue_index = None
+        self.timings.report("SCS export")
+        return written
+
+    def create_element(self, element_name):
+        return ScsElement(element_name)
 
     def create_text_element(self, element_name, content):
         if isinstance(content, bool):
@@ -104,10 +301,7 @@ class ScsExporter:
         if isinstance(content, int) or isinstance(content, float):
             content = str(content)
 
-        element = self._dom.createElement(element_name)
-        element.appendChild(
-            self._dom.createTextNode(content))
-        return element
+        return (element_name, content)
 
     def build_audio_definitions(self, devices):
         """
@@ -121,15 +315,20 @@ class ScsExporter:
         if not len(devices):
             devices.add(ScsAudioDevice(name='Placeholder', channels=2))
 
+        # Cues may play files with differing channel counts through the same
+        # device, so the device needs as many channels as the largest of them.
+        channels = {}
+        for device in devices:
+            channels[device.name] = max(device.channels, channels.get(device.name, 0))
+
         definitions = []
         idx = 0
-        for device in devices:
+        for device in (ScsAudioDevice(name, count) for name, count in channels.items()):
 
             # User-definable identifier
             definitions.append(self.create_text_element(f"PRLogicalDev{idx}", device.name))
 
             # Device Channel Count
-            # @todo: Get channel count of device
             definitions.append(self.create_text_element(f"PRNumChans{idx}", device.channels))
 
             # Automatically include device in new audio cues (optional)
@@ -158,26 +357,14 @@ class ScsExporter:
         all channels on a device.
         """
 
-        try:
-            midi = get_plugin("Midi")
-            controller = get_plugin("Controller")
-        except PluginNotLoadedError:
-            return []
-
-        if not midi.is_loaded() or not controller.is_loaded():
-            return []
-
-        midi_controls = controller.Config.get('protocols.midi', None)
+        midi_controls = self._snapshot.midi_controls
         if not midi_controls:
             return []
 
-        from lisp.plugins.controller.common import LayoutAction
-        from lisp.plugins.midi.midi_utils import midi_str_to_dict
-
         # Group the commands together by MIDI Channel
         control_definitions = [[] for _ in range(16)]
         for control in midi_controls:
-            control_msg = midi_str_to_dict(control[0])
+            control_msg = decode_midi(control[0])
             control_definitions[control_msg['channel']].append([control_msg] + list(control[1:]))
 
         # Sort by how much each Channel is used
@@ -196,7 +383,7 @@ class ScsExporter:
             if not definition_set:
                 continue
 
-            device = self._dom.createElement("PRCCDevice")
+            device = self.create_element("PRCCDevice")
 
             # Device Type:
             #   MIDIIn | RS232In
@@ -243,7 +430,7 @@ class ScsExporter:
                     logger.warn(f"Non-configured command: {command_dict}")
                     continue
 
-                midi_command = self._dom.createElement("PRCCMidiCommand")
+                midi_command = self.create_element("PRCCMidiCommand")
 
                 midi_command.appendChild(
                     self.create_text_element("PRCCMidiCmdType", action_dict[command_action]))
@@ -279,17 +466,13 @@ class ScsExporter:
         * "Pro Plus"    : 8
         * "Platinum"    : 16
         """
-        try:
-            midi = get_plugin("Midi")
-            if not midi.is_loaded():
-                return []
-        except PluginNotLoadedError:
+        if not self._snapshot.midi_output:
             return []
 
         scs_devices = []
         for spec in devices:
 
-            prcs_device = self._dom.createElement("PRCSDevice")
+            prcs_device = self.create_element("PRCSDevice")
 
             # User-definable identifier for the device
             prcs_device.appendChild(
@@ -324,10 +507,9 @@ class ScsExporter:
                 AutoActivatePosn    enum        "start" | <??>
                 AutoActivateTime    integer     <milliseconds>
         """
-        scs_cue = self._dom.createElement("Cue")
-        cue_id, cue_name = self._split_cue_name(lisp_cue)
-        scs_cue.appendChild(self.create_text_element("CueID", cue_id))
-        scs_cue.appendChild(self.create_text_element("Description", cue_name))
+        scs_cue = self.create_element("Cue")
+        scs_cue.appendChild(self.create_text_element("CueID", self._cue_index.cue_id(lisp_cue)))
+        scs_cue.appendChild(self.create_text_element("Description", self._cue_index.name(lisp_cue)))
         if lisp_cue.description:
             scs_cue.appendChild(
                 self.create_text_element("WhenReqd", lisp_cue.description.replace("\n\n", "\n")))
@@ -351,17 +533,17 @@ class ScsExporter:
                 RelStartMode    enum        "ae_prev_sub" | "as_cue" | "as_prev_sub"
                 RelStartTime    integer     <milliseconds>
         """
-        _, cue_name = self._split_cue_name(lisp_cue)
-        scs_subcue = self._dom.createElement("Sub")
+        scs_subcue = self.create_element("Sub")
         scs_subcue.appendChild(self.create_text_element("SubType", scs_cuetype))
-        scs_subcue.appendChild(self.create_text_element("SubDescription", cue_name))
+        scs_subcue.appendChild(
+            self.create_text_element("SubDescription", self._cue_index.name(lisp_cue)))
         return scs_subcue
 
     def build_production_head(self, devices):
-        head = self._dom.createElement("Head")
+        head = self.create_element("Head")
 
         # Name of the Production
-        head.appendChild(self.create_text_element("Title", self._app.session.name()))
+        head.appendChild(self.create_text_element("Title", self._snapshot.title))
 
         # Unique ID of the SCS Production
         if self._prod_id:
@@ -20,68 +20,93 @@
 # You should have received a copy of the GNU General Public License
 # along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
+import os
+from urllib.parse import unquote, urlsplit
+
 from lisp.backend.audio_utils import linear_to_db
-from lisp.plugins import get_plugin
 
 from ..util import ExportKeys, ScsAudioDevice, ScsVideoAudioDevice, ScsDeviceType, SCS_FILE_REL_PREFIX
 
 
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
+# The SCS device name and channel count used for each of LiSP's sinks.
+SINK_DEVICES = {
+    "AutoSink": ("System", 2),
+    # @todo: Implement AlsaSink handling
+    "AlsaSink": ("Alsa", 2),
+    # @todo: Implement JackSink handling
+    "JackSink": ("Jack", 8), # @todo: Get actual number
+    # @todo: Implement PulseSink handling
+    "PulseSink": ("Pulse", 2),
+}
+
+
+def element_value(elements, element_name, property_name, default):
+    """A property of a media element, or the default if the element doesn't give it."""
+    element = elements.get(element_name)
+    if not isinstance(element, dict):
+        return default
+    return element.get(property_name, default)
+
+
 class GstMediaCueExporter:
 
     lisp_plugin = "GstBackend"
     lisp_cuetype = "GstMediaCue"
     scs_subtype_audio = "F"
     scs_subtype_video = "A"
-
-    def __init__(self):
-        print("GstMedia cue exporter init")
+    exported_properties = ("media", "fadein_duration", "fadeout_duration")
 
     def _build_audio_cue(self, exporter, lisp_cue, scs_device, scs_subcue):
-        details = exporter.dom.createElement("AudioFile")
+        details = exporter.create_element("AudioFile")
+
+        media = lisp_cue.get("media", {})
+        elements = media.get("elements", {})
 
         details.appendChild(
             exporter.create_text_element(
-                "FileName", self._build_file_path(lisp_cue)))
+                "FileName", self._build_file_path(exporter, lisp_cue)))
 
         details.appendChild(exporter.create_text_element("LogicalDev0", scs_device.name))
 
-        if hasattr(lisp_cue.media.elements, "Volume"):
+        if "Volume" in elements:
             details.appendChild(
                 exporter.create_text_element(
-                    "DBLevel0", linear_to_db(lisp_cue.media.elements.Volume.volume)))
+                    "DBLevel0", linear_to_db(element_value(elements, "Volume", "volume", 1.0))))
 
-        if hasattr(lisp_cue.media.elements, "AudioPan"):
+        if "AudioPan" in elements:
             # LiSP pan: -1.0 <-> 1.0
             # SCS pan: 0 -> 1000
-            pan = lisp_cue.media.elements.AudioPan.pan
+            pan = element_value(elements, "AudioPan", "pan", 0.0)
             if pan != 0.0:
                 details.appendChild(
                     exporter.create_text_element("Pan0", int((pan + 1) * 500)))
 
-        fadein = lisp_cue.fadein_duration
+        fadein = lisp_cue.get("fadein_duration", 0)
         if fadein > 0:
             fadein = int(fadein * 1000) # seconds -> milliseconds
             details.appendChild(
                 exporter.create_text_element("FadeInTime", fadein))
 
-        fadeout = lisp_cue.fadeout_duration
+        fadeout = lisp_cue.get("fadeout_duration", 0)
         if fadeout > 0:
             fadeout = int(fadeout * 1000) # seconds -> milliseconds
             details.appendChild(
                 exporter.create_text_element("FadeOutTime", fadeout))
 
-        start_time = lisp_cue.media.start_time
+        start_time, end_time = self._media_times(lisp_cue)
         if start_time > 0:
             details.appendChild(
                 exporter.create_text_element("StartAt", start_time))
 
-        end_time = lisp_cue.media.stop_time
         if end_time > 0:
             details.appendChild(
                 exporter.create_text_element("EndAt", end_time))
 
         # LiSP: -1 == unlimited loops; 0 == no loop; 1+ == loop count
-        loop_count = lisp_cue.media.loop
+        loop_count = media.get("loop", 0)
         if loop_count != 0:
             details.appendChild(
                 exporter.create_text_element("Loop", True))
@@ -94,32 +119,16 @@ class GstMediaCueExporter:
 
         scs_subcue.appendChild(details)
 
-    def _build_device(self, cue_type, lisp_cue):
-
-        if hasattr(lisp_cue.media.elements, "AutoSink"):
-            sink_name = "System"
-            sink_channels = 2
-
-        elif hasattr(lisp_cue.media.elements, "AlsaSink"):
-            # @todo: Implement AlsaSink handling
-            sink_name = "Alsa"
-            sink_channels = 2
-
-        elif hasattr(lisp_cue.media.elements, "JackSink"):
-            # @todo: Implement JackSink handling
-            sink_name = "Jack"
-            sink_channels = 8 # @todo: Get actual number
+    def _build_device(self, exporter, cue_type, lisp_cue):
+        sink = self._find_sink(exporter, lisp_cue.get("media", {}))
+        if sink not in SINK_DEVICES:
+            logger.warning(f"'{lisp_cue.name}' outputs to an unrecognised sink: {sink}")
+            return None
+        sink_name, sink_channels = SINK_DEVICES[sink]
 
-        elif hasattr(lisp_cue.media.elements, "PulseSink"):
-            # @todo: Implement PulseSink handling
-            sink_name = "Pulse"
-            sink_channels = 2
-
-        else:
-            print("No Sink?")
-            for elem in lisp_cue.media.elements:
-                print(elem)
-            return ()
+        media_info = lisp_cue.extras.get("media_info")
+        if media_info and media_info.channels:
+            sink_channels = max(sink_channels, media_info.channels)
 
         if cue_type == ScsDeviceType.Audio:
             return ScsAudioDevice(
@@ -131,83 +140,176 @@ class GstMediaCueExporter:
                 name=sink_name
             )
 
-    def _build_file_path(self, lisp_cue):
-        file_uri = lisp_cue.media.elements.UriInput.input_uri()
-        relative_path = file_uri.relative_path.replace('/', '\\')
+    def _find_sink(self, exporter, media):
+        # Imported cues, and saved sessions, needn't list the sink amongst
+        # the elements (it has no properties to keep), only in the pipeline
+        for element_name in (*media.get("pipe", ()), *media.get("elements", {})):
+            if element_name in SINK_DEVICES:
+                return element_name
+
+        pipe = media.get("pipe")
+        return pipe[-1] if pipe else exporter.context.sink_element
+
+    def _build_file_path(self, exporter, lisp_cue):
+        relative_path = self._relative_path(exporter, lisp_cue).replace('/', '\\')
         return f"{SCS_FILE_REL_PREFIX}{relative_path}"
 
     def _build_video_cue(self, exporter, lisp_cue, scs_device, scs_subcue):
+        media = lisp_cue.get("media", {})
+        elements = media.get("elements", {})
 
         scs_subcue.appendChild(
             exporter.create_text_element("OutputScreen", 2))
 
-        if lisp_cue.media.loop != 0:
+        if media.get("loop", 0) != 0:
             scs_subcue.appendChild(
                 exporter.create_text_element("VideoRepeat", True))
 
         scs_subcue.appendChild(
             exporter.create_text_element("VideoLogicalAudioDev", scs_device.name))
 
-        if hasattr(lisp_cue.media.elements, "Volume"):
+        if "Volume" in elements:
             scs_subcue.appendChild(
                 exporter.create_text_element(
-                    "SubDBLevel0", linear_to_db(lisp_cue.media.elements.Volume.volume)))
+                    "SubDBLevel0", linear_to_db(element_value(elements, "Volume", "volume", 1.0))))
 
-        if hasattr(lisp_cue.media.elements, "AudioPan"):
+        if "AudioPan" in elements:
             # LiSP pan: -1.0 <-> 1.0
             # SCS pan: 0 -> 1000
-            pan = lisp_cue.media.elements.AudioPan.pan
+            pan = element_value(elements, "AudioPan", "pan", 0.0)
             if pan != 0.0:
                 scs_subcue.appendChild(
                     exporter.create_text_element("SubDBPan0", int((pan + 1) * 500)))
 
-        fadein = lisp_cue.fadein_duration
+        fadein = lisp_cue.get("fadein_duration", 0)
         if fadein > 0:
             fadein = int(fadein * 1000) # seconds -> milliseconds
             scs_subcue.appendChild(
                 exporter.create_text_element("PLFadeInTime", fadein))
 
-        fadeout = lisp_cue.fadeout_duration
+        fadeout = lisp_cue.get("fadeout_duration", 0)
         if fadeout > 0:
             fadeout = int(fadeout * 1000) # seconds -> milliseconds
             scs_subcue.appendChild(
                 exporter.create_text_element("PLFadeOutTime", fadeout))
 
-        video_file = exporter.dom.createElement("VideoFile")
+        video_file = exporter.create_element("VideoFile")
 
         video_file.appendChild(
-            exporter.create_text_element("FileName", self._build_file_path(lisp_cue)))
+            exporter.create_text_element("FileName", self._build_file_path(exporter, lisp_cue)))
 
-        start_time = lisp_cue.media.start_time
+        start_time, end_time = self._media_times(lisp_cue)
         if start_time > 0:
             video_file.appendChild(
                 exporter.create_text_element("StartAt", start_time))
 
-        end_time = lisp_cue.media.stop_time
         if end_time > 0:
             video_file.appendChild(
                 exporter.create_text_element("EndAt", end_time))
 
         scs_subcue.appendChild(video_file)
 
-    def _determine_export_cue_type(self, lisp_cue):
-        uri = lisp_cue.media.elements.UriInput.uri
-        ext = uri[uri.rindex('.') + 1:]
-        exts = get_plugin('GstBackend').supported_extensions()
-        if ext in exts['audio']:
-            return ScsDeviceType.Audio
-        if ext in exts['video']:
-            return ScsDeviceType.VideoAudio
-        print(f"Unable to determine type of file extension {ext}!")
-        return None
+    def _media_uri(self, lisp_cue):
+        # Saved sessions leave out properties still at their defaults
+        elements = lisp_cue.get("media", {}).get("elements", {})
+        return element_value(elements, "UriInput", "uri", "")
+
+    def _media_path(self, exporter, lisp_cue):
+        absolute_path = lisp_cue.extras.get("absolute_path")
+        if absolute_path is None:
+            absolute_path = os.path.join(exporter.session_dir, self._relative_path(exporter, lisp_cue))
+        return absolute_path
+
+    def _media_times(self, lisp_cue):
+        """The start and end times of the media, checked against its actual duration."""
+        media = lisp_cue.get("media", {})
+        start_time = media.get("start_time", 0)
+        end_time = media.get("stop_time", 0)
+
+        media_info = lisp_cue.extras.get("media_info")
+        if media_info and media_info.duration:
+            if start_time >= media_info.duration:
+                logger.warning(
+                    f"'{lisp_cue.name}' starts at {start_time}ms, but its media is only "
+                    f"{media_info.duration}ms long. Starting from the beginning instead.")
+                start_time = 0
+            if end_time > media_info.duration:
+                logger.warning(
+                    f"'{lisp_cue.name}' ends at {end_time}ms, but its media is only "
+                    f"{media_info.duration}ms long. Playing to the end instead.")
+                end_time = 0
+
+        return start_time, end_time
+
+    def _relative_path(self, exporter, lisp_cue):
+        relative_path = lisp_cue.extras.get("relative_path")
+        if relative_path is None:
+            # Not resolved from a live cue, so read from a saved session. LiSP
+            # saves local paths relative to the session file, but a session
+            # written by the command line converter gives them in full.
+            uri = self._media_uri(lisp_cue)
+            relative_path = unquote(urlsplit(uri).path) if "://" in uri else uri
+            if os.path.isabs(relative_path):
+                relative_path = os.path.relpath(relative_path, exporter.session_dir)
+        return relative_path
+
+    def _determine_export_cue_type(self, exporter, lisp_cue):
+        ext = os.path.splitext(self._media_uri(lisp_cue))[1][1:]
+        cue_type = exporter.context.media_type(ext)
+        if cue_type is None:
+            logger.warning(f"Unable to determine type of file extension {ext}!")
+        return cue_type
+
+    def snapshot_cue(self, lisp_cue):
+        """Resolves, whilst on the GUI thread, where the media file is."""
+        if not hasattr(lisp_cue.media.elements, "UriInput"):
+            return {}
+        file_uri = lisp_cue.media.elements.UriInput.input_uri()
+        return {
+            "absolute_path": file_uri.absolute_path,
+            "relative_path": file_uri.relative_path,
+        }
+
+    def package_media(self, exporter, lisp_cues, packager):
+        """Adds the media files to a package, pointing the cues at their packaged copies."""
+        for lisp_cue in lisp_cues:
+            if lisp_cue.cuetype != self.lisp_cuetype:
+                continue
+            if not self._media_uri(lisp_cue):
+                continue
+            media_path = self._media_path(exporter, lisp_cue)
+            lisp_cue.extras["absolute_path"] = media_path
+            lisp_cue.extras["relative_path"] = packager.add(media_path)
+
+    def prepare_export(self, exporter, lisp_cues):
+        """Probes the media files of all cues about to be exported, in parallel.
+
+        Their actual channel counts and durations are then available to
+        each cue's export.
+        """
+        media_cues = [
+            lisp_cue for lisp_cue in lisp_cues
+            if lisp_cue.cuetype == self.lisp_cuetype
+            and self._media_uri(lisp_cue)
+        ]
+        media_paths = [self._media_path(exporter, lisp_cue) for lisp_cue in media_cues]
+        media_info = exporter.prober.probe_all(media_paths)
+        for lisp_cue, media_path in zip(media_cues, media_paths):
+            lisp_cue.extras["media_info"] = media_info.get(media_path)
 
     def export_cue(self, exporter, lisp_cue):
-        if not hasattr(lisp_cue.media.elements, "UriInput"):
+        if not self._media_uri(lisp_cue):
             # @todo: Warn user that this cue will be skipped before export process
             return []
 
-        scs_cuetype = self._determine_export_cue_type(lisp_cue)
-        scs_device = self._build_device(scs_cuetype, lisp_cue)
+        scs_cuetype = self._determine_export_cue_type(exporter, lisp_cue)
+        if scs_cuetype is None:
+            return ()
+
+        scs_device = self._build_device(exporter, scs_cuetype, lisp_cue)
+        if scs_device is None:
+            return ()
+
         if scs_cuetype == ScsDeviceType.Audio:
             subcue = exporter.build_generic_subcue(lisp_cue, self.scs_subtype_audio)
             self._build_audio_cue(exporter, lisp_cue, scs_device, subcue)
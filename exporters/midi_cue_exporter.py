@@ -20,14 +20,14 @@
 # You should have received a copy of the GNU General Public License
 # along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
 
-try:
-    from lisp.plugins.midi.midi_utils import midi_str_to_dict
-except ImportError:
-    midi_str_to_dict = None
+import logging
 
+from ..midi_codec import decode_midi
 from ..util import ExportKeys, ScsDeviceType, ScsMidiDevice
 
 
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
 # Some messages can be converted directly to SCS equivalents...
 MESSAGE_TYPE_MAPPING = {
     "note_on": "ON",
@@ -53,25 +53,23 @@ class MidiCueExporter:
     lisp_plugin = "Midi"
     lisp_cuetype = "MidiCue"
     scs_cuetype = "M"
-
-    def __init__(self):
-        print("MIDI cue exporter init")
+    exported_properties = ("message",)
 
     def export_cue(self, exporter, lisp_cue):
         scs_device = ScsMidiDevice(name='MIDI')
         scs_cue = exporter.build_generic_cue(lisp_cue)
         subcue = exporter.build_generic_subcue(lisp_cue, self.scs_cuetype)
-        details = exporter.dom.createElement("ControlMessage")
+        details = exporter.create_element("ControlMessage")
 
         details.appendChild(exporter.create_text_element("CMLogicalDev", scs_device.name))
 
-        message = lisp_cue.properties()['message']
+        message = lisp_cue.get('message')
         if message:
-            message = midi_str_to_dict(message)
+            message = decode_midi(message)
 
             lisp_type = message['type']
             if lisp_type not in MESSAGE_TYPE_MAPPING and lisp_type not in MESSAGE_FREE_MAPPING:
-                print(f"Unrecognized MIDI message type '{ lisp_type }'")
+                logger.warning(f"Unrecognized MIDI message type '{ lisp_type }'")
                 return None
 
             scs_type = MESSAGE_TYPE_MAPPING.get(lisp_type, "FREE")
@@ -0,0 +1,270 @@
+# This file is a derivation of work on - and as such shares the same
+# licence as - Linux Show Player
+#
+# Linux Show Player:
+#   Copyright 2012-2023 Francesco Ceruti <ceppofrancy@gmail.com>
+#
+# This file:
+#   Copyright 2023 s0600204
+#
+# Linux Show Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Linux Show Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Conversion between SCS showfiles and LiSP sessions, without LiSP's UI.
+
+LiSP's plugins are not loaded here, so the application, its cue model and
+its cues are stood in for by the stubs below, and the importer and
+exporter are told what the plugins would otherwise have told them.
+"""
+
+import json
+import logging
+import mimetypes
+import os
+import uuid
+
+# pylint: disable=import-error
+from lisp.core.signal import Signal
+
+from .context import ScsBackendContext
+from .exporter import ScsExporter
+from .importer import ScsImporter
+from .timing import timings_from_environment
+from .util import ScsCueSnapshot, ScsExportSnapshot, SCS_FILE_EXT
+
+
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
+LISP_FILE_EXT = '.lsp'
+
+# The sink LiSP itself defaults to.
+DEFAULT_SINK_ELEMENT = "AutoSink"
+
+# Extensions GStreamer can be relied upon to play, in case the system's
+# mimetypes database doesn't know of them.
+KNOWN_EXTENSIONS = {
+    "audio": {"aif", "aiff", "flac", "m4a", "mp3", "oga", "ogg", "opus", "wav"},
+    "video": {"avi", "m4v", "mkv", "mov", "mp4", "mpeg", "mpg", "ogv", "webm"},
+}
+
+
+def headless_backend_context():
+    """Stands in for what LiSP's GStreamer backend would report."""
+    extensions = {
+        media_type: set(known) for media_type, known in KNOWN_EXTENSIONS.items()
+    }
+    for extension, mimetype in mimetypes.types_map.items():
+        media_type = mimetype.split('/', 1)[0]
+        if media_type in extensions:
+            extensions[media_type].add(extension[1:])
+
+    return ScsBackendContext(
+        audio_extensions=extensions["audio"],
+        video_extensions=extensions["video"],
+        sink_element=DEFAULT_SINK_ELEMENT,
+    )
+
+
+class StubCue:
+    """Stands in for a LiSP cue, holding nothing but its properties."""
+
+    def __init__(self, cuetype):
+        self.id = str(uuid.uuid4())
+        self.cuetype = cuetype
+        self._properties = {}
+
+    def properties(self):
+        return dict(self._properties, _type_=self.cuetype, id=self.id)
+
+    def update_properties(self, properties):
+        self._properties.update(properties)
+
+
+class StubCueFactory:
+
+    @staticmethod
+    def create_cue(cuetype):
+        return StubCue(cuetype)
+
+
+class StubCueModel:
+
+    def __init__(self):
+        self._cues = []
+        self.item_added = Signal()
+        self.item_removed = Signal()
+
+    def __iter__(self):
+        return iter(self._cues)
+
+    def __len__(self):
+        return len(self._cues)
+
+    def add(self, cue):
+        self._cues.append(cue)
+        self.item_added.emit(cue)
+
+
+class StubSession:
+
+    def __init__(self, session_file):
+        self.session_file = session_file
+
+    def dir(self):
+        return os.path.dirname(self.session_file)
+
+    def name(self):
+        return os.path.splitext(os.path.basename(self.session_file))[0]
+
+
+class StubApplication:
+
+    def __init__(self, session_file=""):
+        self.cue_factory = StubCueFactory()
+        self.cue_model = StubCueModel()
+        self.session = StubSession(session_file)
+
+
+class HeadlessScsImporter(ScsImporter):
+
+    def _check_subtype(self, subtype):
+        # There are no plugins to check for, so accept any SubType we can convert
+        if subtype not in self._importers:
+            logger.warning(f"No registered importer for SCS Sub Cue of type {subtype}")
+            return False
+        return True
+
+    def create_backend_context(self):
+        return headless_backend_context()
+
+
+class HeadlessScsExporter(ScsExporter):
+
+    def create_backend_context(self):
+        return headless_backend_context()
+
+    def snapshot_session(self, session_dict):
+        """Creates a snapshot from a saved LiSP session, rather than from live cues."""
+        self.timings.reset()
+
+        cue_dicts = session_dict.get("cues", [])
+        cuetypes = set()
+        cue_snapshots = []
+        with self.timings.stage("snapshot", len(cue_dicts)):
+            for cue_dict in sorted(cue_dicts, key=lambda cue: cue.get("index", 0)):
+                cue_snapshot = ScsCueSnapshot(cue_dict)
+                if cue_snapshot.cuetype not in cuetypes:
+                    cuetypes.add(cue_snapshot.cuetype)
+                    self.init_exporter(cue_snapshot.cuetype)
+                cue_snapshots.append(cue_snapshot)
+
+        return ScsExportSnapshot(
+            title=self._app.session.name(),
+            session_dir=self._app.session.dir(),
+            cues=cue_snapshots,
+            backend=self.create_backend_context(),
+            midi_output=True,
+            midi_controls=None,
+        )
+
+
+def scs_to_lisp(source, destination, workers=1):
+    """Converts an SCS showfile to a LiSP session file.
+
+    `workers` is the number of processes to convert cues with, as for
+    `ScsImporter.parse_file`.
+    """
+    app = StubApplication(destination)
+    importer = HeadlessScsImporter(app, timings_from_environment())
+
+    with open(source, mode="rb") as file_contents:
+        showfile = importer.parse_file(
+            file_contents, os.path.dirname(os.path.abspath(source)), workers=workers)
+
+    if not importer.validate_file(showfile):
+        raise ValueError(f"{source} contains cues that can not be converted.")
+
+    importer.import_file(showfile)
+
+    cues = []
+    for index, cue in enumerate(app.cue_model):
+        cue_dict = cue.properties()
+        cue_dict["index"] = index
+        cues.append(cue_dict)
+
+    session_dict = {
+        "session": {"layout_type": "ListLayout"},
+        "cues": cues,
+    }
+    with open(destination, mode="w", encoding="utf-8") as file:
+        json.dump(session_dict, file, indent=4, sort_keys=True)
+
+    return len(cues)
+
+
+def check_file(source, stop_early=False):
+    """Checks whether an SCS showfile may be converted, without converting it.
+
+    Returns an ScsPrescan.
+    """
+    importer = HeadlessScsImporter(StubApplication())
+    with open(source, mode="rb") as file_contents:
+        return importer.prescan_file(file_contents, stop_early)
+
+
+def lisp_to_scs(source, destination, package=False, link=False):
+    """Converts a LiSP session file to an SCS showfile.
+
+    If `package` is True, the media files used are also gathered beside the
+    showfile (hard-linked rather than copied if `link` is True).
+    """
+    with open(source, mode="r", encoding="utf-8") as file:
+        session_dict = json.load(file)
+
+    app = StubApplication(os.path.abspath(source))
+    exporter = HeadlessScsExporter(app, timings_from_environment())
+    snapshot = exporter.snapshot_session(session_dict)
+
+    destination_dir = os.path.dirname(os.path.abspath(destination))
+    if package:
+        exporter.package_media(snapshot, destination_dir, link)
+    else:
+        os.makedirs(destination_dir, exist_ok=True)
+
+    with open(destination, mode="w", encoding="utf-8") as file:
+        return exporter.export(None, snapshot, file)
+
+
+def convert_file(source, destination, package=False, link=False, workers=1):
+    """Converts a file in whichever direction its extension calls for.
+
+    Returns the number of cues converted.
+    """
+    if source.endswith(SCS_FILE_EXT):
+        return scs_to_lisp(source, destination, workers)
+    if source.endswith(LISP_FILE_EXT):
+        return lisp_to_scs(source, destination, package, link)
+    raise ValueError(f"Don't know how to convert {source}")
+
+
+def destination_path(source, destination_dir, package=False):
+    """Where the conversion of a file within a directory should be written to.
+
+    Packaged showfiles are each given a folder of their own, so that the
+    media files of different shows don't mix.
+    """
+    stem, ext = os.path.splitext(os.path.basename(source))
+    new_ext = LISP_FILE_EXT if ext == SCS_FILE_EXT else SCS_FILE_EXT
+    if package and new_ext == SCS_FILE_EXT:
+        destination_dir = os.path.join(destination_dir, stem)
+    return os.path.join(destination_dir, stem + new_ext)
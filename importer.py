@@ -1,24 +1,63 @@
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import logging
-from xml.dom.minidom import parse as xml_parse
+import multiprocessing
 
 from lisp.backend.audio_utils import db_to_linear
 from lisp.core.plugin import PluginNotLoadedError
 from lisp.plugins import get_plugin
 
+from .context import ScsBackendContext
 from .importers import find_importers
-from .util import CUEID_MARKUP_PREFIX, CUEID_MARKUP_SUFFIX, SCS_FILE_REL_PREFIX
+from .preflight import MediaResolver
+from .showfile import (
+    ScsRecord,
+    ScsShowfile,
+    count_cue_elements,
+    iter_cue_elements,
+    iter_cue_slices,
+    prescan_showfile,
+)
+from .timing import NullTimings
+from .util import (
+    CUEID_MARKUP_PREFIX,
+    CUEID_MARKUP_SUFFIX,
+    SCS_FILE_REL_PREFIX,
+    markup_cue_id,
+)
 
 
 logger = logging.getLogger(__name__) # pylint: disable=invalid-name
 
+# How many cues are sent to a worker process at a time.
+PARALLEL_IMPORT_BATCH_SIZE = 100
+
+# The importer used by each worker process; see `_init_conversion_worker`.
+_worker_importer = None # pylint: disable=invalid-name
+
+
+def _init_conversion_worker(file_path, context):
+    global _worker_importer # pylint: disable=global-statement,invalid-name
+    _worker_importer = ScsImporter(None)
+    _worker_importer.prepare_conversion(file_path, context)
+
+
+def _convert_cues(cues_data, subtypes):
+    return _worker_importer.convert_batch(cues_data, subtypes)
+
 
 class ScsImporter:
 
-    def __init__(self, app):
+    def __init__(self, app, timings=None, showfile_cache=None):
 
         self._app = app
         self._imported_file_path = None
+        self._media_files = None
+        self._context = None
+        self._showfile_cache = showfile_cache
+        self.timings = timings or NullTimings()
 
         # Find importers (but don't init them)
         self._importers = {}
@@ -31,6 +70,11 @@ class ScsImporter:
             self._importers[subtype] = importer
             logger.debug(f'Registered importer for SCS Cue SubType "{subtype}": {name}.')
 
+    @property
+    def context(self):
+        """What the media backend supports, resolved at the start of each import."""
+        return self._context
+
     @property
     def cue_factory(self):
         return self._app.cue_factory
@@ -40,10 +84,14 @@ class ScsImporter:
         return self._app.cue_model
 
     def build_generic_cue(self, scs_cue, scs_subcue):
-        """Creates a new LiSP cue."""
+        """Creates a new LiSP cue.
+
+        The dict holds only strings, so importers creating several cues from
+        one SCS cue may share it between them with shallow copies.
+        """
         cue_dict = {}
 
-        if scs_cue.getElementsByTagName("Sub").length > 1:
+        if len(scs_cue.subrecords("Sub")) > 1:
             cue_name = self.get_string_value(scs_subcue, "SubDescription")
         else:
             cue_name = self.get_string_value(scs_cue, "Description")
@@ -52,17 +100,17 @@ class ScsImporter:
         # See comment for CUEID_MARKUP_PREFIX in util.py
         cue_dict["name"] = f"{CUEID_MARKUP_PREFIX}{cue_id}{CUEID_MARKUP_SUFFIX} {cue_name}"
 
-        whenreqd = self.get_string_value(scs_cue, "WhenReqd").replace("\n", "\n\n")
+        whenreqd = self.get_string_value(scs_cue, "WhenReqd")
         if whenreqd:
-            cue_dict["description"] = whenreqd
+            cue_dict["description"] = whenreqd.replace("\n", "\n\n")
 
         return cue_dict
 
     def get_boolean_value(self, node, tag_name):
-        value = self.get_string_value(node, tag_name)
+        value = self.get_integer_value(node, tag_name)
         if value is None:
             return None
-        return bool(node)
+        return bool(value)
 
     def get_integer_value(self, node, tag_name):
         value = self.get_string_value(node, tag_name)
@@ -74,8 +122,11 @@ class ScsImporter:
         file_path = self.get_string_value(node, tag_name)
         if file_path is None:
             return None
-        file_path = file_path.replace(SCS_FILE_REL_PREFIX, '', 1)
-        return f"file:///{ self._imported_file_path }/{ file_path }"
+        uri = f"file:///{ self._imported_file_path }/{ file_path.replace(SCS_FILE_REL_PREFIX, '', 1) }"
+
+        # Noted, so the file may be looked for once all have been read
+        self._media_files[uri] = file_path
+        return uri
 
     def get_float_value(self, node, tag_name):
         value = self.get_string_value(node, tag_name)
@@ -94,8 +145,7 @@ class ScsImporter:
         return pan / 500 - 1
 
     def get_string_value(self, node, tag_name):
-        elems = node.getElementsByTagName(tag_name)
-        return elems[0].childNodes[0].nodeValue if elems else None
+        return node.get(tag_name)
 
     def get_time_value(self, node, tag_name):
         time = self.get_integer_value(node, tag_name)
@@ -103,58 +153,294 @@ class ScsImporter:
             return None
         return time / 1000
 
-    def import_file(self, file_contents, file_path):
-        # Obv. can't call it "import" as thats a reserved name.
-        self._imported_file_path = file_path
-
-        dom = xml_parse(file_contents)
-        for cue in dom.getElementsByTagName("Cue"):
-            for subcue in cue.getElementsByTagName("Sub"):
+    def _check_subtype(self, subtype):
+        # Check we have an importer for this sub cue type
+        if subtype not in self._importers:
+            logger.warning(f"No registered importer for SCS Sub Cue of type {subtype}")
+            return False
 
-                subtype = self.get_string_value(subcue, "SubType")
+        # Check that the plugin the importer requires is installed...
+        plugin_name = self._importers[subtype].lisp_plugin
+        try:
+            plugin = get_plugin(plugin_name)
+        except PluginNotLoadedError:
+            logger.warning(f'SCS Sub Cue type "{subtype}" requires the {plugin_name} plugin, but this can not be found.')
+            return False
 
-                # Initialise an instance of the importer if needed
-                if isinstance(self._importers[subtype], type):
-                    self._importers[subtype] = self._importers[subtype]()
+        # ...and enabled.
+        if not plugin.is_loaded():
+            logger.warning(f'SCS Sub Cue type "{subtype}" requires the {plugin_name} plugin, but this is not enabled.')
+            return False
 
-                for cue_dict in self._importers[subtype].import_cue(self, cue, subcue):
-                    lisp_cue = self._app.cue_factory.create_cue(self._importers[subtype].lisp_cuetype)
-                    lisp_cue.update_properties(cue_dict)
-                    self._app.cue_model.add(lisp_cue)
+        return True
 
-        self._imported_file_path = None
+    def create_backend_context(self):
+        return ScsBackendContext.from_backend()
 
-    def validate_file(self, file_contents):
-        checked_types = []
-        dom = xml_parse(file_contents)
-        validation_passed = True
+    def prepare_conversion(self, file_path, context):
+        """Readies a worker process's importer to convert cues from the given showfile."""
+        self._imported_file_path = file_path
+        self._context = context
 
-        for subcue in dom.getElementsByTagName("Sub"):
+    def check_subtypes(self, cue, showfile):
+        """Checks that each SubType within the cue may be imported, if not already known."""
+        for subcue in cue.subrecords("Sub"):
             subtype = self.get_string_value(subcue, "SubType")
+            if subtype not in showfile.subtypes:
+                with self.timings.stage("validate"):
+                    showfile.subtypes[subtype] = self._check_subtype(subtype)
 
-            if subtype in checked_types:
-                continue
-            checked_types.append(subtype)
-
-            # Check we have an importer for this sub cue type
-            if subtype not in self._importers:
-                logger.warning(f"No registered importer for SCS Sub Cue of type {subtype}")
-                validation_passed = False
-                continue
+    def convert_cue(self, cue, subtypes):
+        """Yields the LiSP cue type and cue dict of each cue converted from an SCS cue.
 
-            # Check that the plugin the importer requires is installed...
-            plugin_name = self._importers[subtype].lisp_plugin
-            try:
-                plugin = get_plugin(plugin_name)
-            except PluginNotLoadedError:
-                logger.warning(f'SCS Sub Cue type "{subtype}" requires the {plugin_name} plugin, but this can not be found.')
-                validation_passed = False
-                continue
+        Sub cues of a SubType that may not be imported are skipped.
+        """
+        for subcue in cue.subrecords("Sub"):
 
-            # ...and enabled.
-            if not plugin.is_loaded():
-                logger.warning(f'SCS Sub Cue type "{subtype}" requires the {plugin_name} plugin, but this is not enabled.')
-                validation_passed = False
+            subtype = self.get_string_value(subcue, "SubType")
+            if not subtypes[subtype]:
                 continue
 
-        return validation_passed
+            # Initialise an instance of the importer if needed
+            if isinstance(self._importers[subtype], type):
+                self._importers[subtype] = self._importers[subtype]()
+
+            importer = self._importers[subtype]
+            cue_dicts = self.timings.timed_iter(
+                f"convert.{importer.__class__.__name__}",
+                importer.import_cue(self, cue, subcue))
+            for cue_dict in cue_dicts:
+                yield importer.lisp_cuetype, cue_dict
+
+    def convert_batch(self, cues_data, subtypes):
+        """Converts a batch of cues, as passed to a worker process.
+
+        Returns the converted cues, and the media files they refer to.
+        """
+        self._media_files = {}
+        try:
+            cues = []
+            for cue_data in cues_data:
+                cues.extend(self.convert_cue(ScsRecord.from_data(cue_data), subtypes))
+            return cues, self._media_files
+        finally:
+            self._media_files = None
+
+    def import_file(self, showfile):
+        # Obv. can't call it "import" as thats a reserved name.
+        with self.timings.stage("create", len(showfile.cues())):
+            for lisp_cuetype, cue_dict in showfile.cues():
+                lisp_cue = self.cue_factory.create_cue(lisp_cuetype)
+                lisp_cue.update_properties(cue_dict)
+                self.cue_model.add(lisp_cue)
+
+        self.timings.report("SCS import")
+
+    def merge_file(self, showfile, position=None):
+        """Adds the cues of a showfile to the current session, rather than replacing it.
+
+        The cues are inserted, in order, from `position` (or after the last
+        cue if None). Cues whose CueID is already used within the session
+        are skipped. Returns the number of cues added.
+        """
+        existing_ids = set()
+        with self.timings.stage("index", len(self.cue_model)):
+            for lisp_cue in self.cue_model:
+                cue_id = markup_cue_id(lisp_cue.name)
+                if cue_id is not None:
+                    existing_ids.add(cue_id)
+
+        if position is None:
+            position = len(self.cue_model)
+
+        added = 0
+        skipped = set()
+        with self.timings.stage("create", len(showfile.cues())):
+            for lisp_cuetype, cue_dict in showfile.cues():
+                cue_id = markup_cue_id(cue_dict["name"])
+                if cue_id in existing_ids:
+                    skipped.add(cue_id)
+                    continue
+
+                lisp_cue = self.cue_factory.create_cue(lisp_cuetype)
+                lisp_cue.update_properties(cue_dict)
+                # The layout inserts each cue at the index it's been given
+                lisp_cue.index = position + added
+                self.cue_model.add(lisp_cue)
+                added += 1
+
+        if skipped:
+            logger.info(
+                f"Skipped {len(skipped)} cue(s) whose CueID is already in use: "
+                + ", ".join(sorted(skipped)))
+        self.timings.report("SCS merge")
+        return added
+
+    def parse_file(self, file_contents, file_path, report_progress=None, workers=1, selection=None):
+        """Reads an SCS showfile, converting its cues as they are read.
+
+        This touches neither the cue model nor the UI, so may be run away
+        from the GUI thread. If given, `report_progress` is called with the
+        number of cues read so far, and the total number in the file.
+
+        If `workers` is more than 1, cues are converted by a pool of that
+        many processes, whilst the file continues to be read. The file is
+        still read in this process, and each cue passed to a worker costs
+        about as much as converting it here, so this is rarely faster.
+
+        If the importer was given a showfile cache, and the file has been
+        read before, its cues are taken from the cache instead.
+
+        If `selection` is given (a list of offsets, as found by
+        `index_cue_elements`), only the cues at those offsets are read.
+        """
+        showfile = ScsShowfile(file_path)
+        self._imported_file_path = file_path
+        self._media_files = showfile.media_files
+        self.timings.reset()
+        self._context = self.create_backend_context()
+
+        cache_key = None
+        cached = None
+        recorded = None
+        if self._showfile_cache is not None and selection is None:
+            with self.timings.stage("cache.load"):
+                cache_key = self._showfile_cache.key(file_contents)
+                cached = self._showfile_cache.load(cache_key)
+
+        if selection is not None:
+            total = len(selection)
+            cues = self.timings.timed_iter(
+                "parse",
+                (ScsRecord.from_element(element)
+                 for element in iter_cue_slices(file_contents, selection)))
+        elif cached is not None:
+            total = len(cached)
+            cues = (ScsRecord.from_data(cue_data) for cue_data in cached)
+        else:
+            total = count_cue_elements(file_contents) if report_progress else 0
+            cues = self.timings.timed_iter(
+                "parse",
+                (ScsRecord.from_element(element) for element in iter_cue_elements(file_contents)))
+            if cache_key is not None:
+                recorded = []
+                cues = self._recorded(cues, recorded)
+
+        try:
+            if workers > 1:
+                self._convert_in_pool(showfile, cues, workers, total, report_progress)
+            else:
+                for done, cue in enumerate(cues, start=1):
+                    self.check_subtypes(cue, showfile)
+                    for lisp_cuetype, cue_dict in self.convert_cue(cue, showfile.subtypes):
+                        showfile.add_cue(lisp_cuetype, cue_dict)
+
+                    if report_progress:
+                        report_progress(done, max(done, total))
+        finally:
+            self._imported_file_path = None
+            self._media_files = None
+
+        # Only now that the whole file has been read without error
+        if recorded is not None:
+            with self.timings.stage("cache.save", len(recorded)):
+                self._showfile_cache.save(cache_key, recorded)
+
+        with self.timings.stage("preflight", len(showfile.media_files)):
+            self.preflight_media(showfile)
+
+        return showfile
+
+    @staticmethod
+    def _recorded(cues, recorded):
+        for cue in cues:
+            recorded.append(cue.to_data())
+            yield cue
+
+    def _convert_in_pool(self, showfile, cues, workers, total, report_progress):
+        # Spawned rather than forked, as forking a process running Qt is unsafe
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_conversion_worker,
+            initargs=(self._imported_file_path, self._context))
+        pending = deque()
+        done = 0
+
+        def collect():
+            # Batches are collected in the order they were sent, keeping the cues in order
+            nonlocal done
+            future, count = pending.popleft()
+            with self.timings.stage("convert.pool", count):
+                converted, media_files = future.result()
+            for lisp_cuetype, cue_dict in converted:
+                showfile.add_cue(lisp_cuetype, cue_dict)
+            showfile.media_files.update(media_files)
+
+            done += count
+            if report_progress:
+                report_progress(done, max(done, total))
+
+        try:
+            while True:
+                batch = list(islice(cues, PARALLEL_IMPORT_BATCH_SIZE))
+                if not batch:
+                    break
+
+                # Plugins are only loaded here, so SubTypes must be checked here too
+                for cue in batch:
+                    self.check_subtypes(cue, showfile)
+
+                future = pool.submit(
+                    _convert_cues, [cue.to_data() for cue in batch], dict(showfile.subtypes))
+                pending.append((future, len(batch)))
+
+                # Don't read too far ahead of the workers
+                if len(pending) > workers * 2:
+                    collect()
+
+            while pending:
+                collect()
+        finally:
+            # Should a conversion fail, or the user cancel, don't start any more
+            pool.shutdown(cancel_futures=True)
+
+    def preflight_media(self, showfile):
+        """Looks for all the media files the showfile refers to, before any cue is created.
+
+        Files found under a different case to that given are pointed at
+        where they were found. Any not found at all are reported together.
+        """
+        resolved = MediaResolver(showfile.file_path).resolve_all(showfile.media_files.values())
+
+        found_uris = {}
+        missing = []
+        for uri, scs_path in showfile.media_files.items():
+            local_path = resolved[scs_path]
+            if local_path is None:
+                missing.append(scs_path)
+            else:
+                found_uris[uri] = f"file://{local_path}"
+
+        for _, cue_dict in showfile.cues():
+            uri_input = cue_dict.get("media", {}).get("elements", {}).get("UriInput")
+            if uri_input and uri_input["uri"] in found_uris:
+                uri_input["uri"] = found_uris[uri_input["uri"]]
+
+        showfile.missing_media = sorted(set(missing))
+        if showfile.missing_media:
+            logger.warning(
+                f"{len(showfile.missing_media)} media file(s) referred to by the showfile "
+                f"could not be found in {showfile.file_path}:\n"
+                + "\n".join(showfile.missing_media))
+
+    def prescan_file(self, file_contents, stop_early=False):
+        """Quickly checks whether a showfile may be imported, without converting any of it.
+
+        Returns an ScsPrescan. If `stop_early` is True, the check ends at the
+        first problem found.
+        """
+        return prescan_showfile(file_contents, self._check_subtype, stop_early)
+
+    def validate_file(self, showfile):
+        return all(showfile.subtypes.values())
@@ -1,8 +1,11 @@
+from functools import lru_cache
 from os import path
 
 # pylint: disable=import-error
 from lisp.core.loading import load_classes
 
 
+@lru_cache(maxsize=None)
 def find_importers():
-    return load_classes(__package__, path.dirname(__file__))
+    # Only looked for once, however many times asked for
+    return tuple(load_classes(__package__, path.dirname(__file__)))
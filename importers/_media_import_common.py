@@ -20,8 +20,6 @@
 # You should have received a copy of the GNU General Public License
 # along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
 
-from lisp.plugins import get_plugin
-
 
 class MediaCueImporter:
 
@@ -49,7 +47,7 @@ class MediaCueImporter:
         elements["AudioPan"] = self._build_element_pan(importer, scs_subcue)
 
         # Sink
-        pipeline.append(get_plugin('GstBackend').Config.get("pipeline")[-1])
+        pipeline.append(importer.context.sink_element)
 
         # Start and Stop times
         start = importer.get_integer_value(scs_subcue, "StartAt")
@@ -27,9 +27,6 @@ class AudioCueImporter(MediaCueImporter):
 
     scs_subtype = "F"
 
-    def __init__(self):
-        print("Audio cue importer init")
-
     def _build_element_pan(self, importer, scs_subcue):
         return {
             "pan": importer.get_pan_value(scs_subcue, "Pan0")
@@ -20,14 +20,13 @@
 # You should have received a copy of the GNU General Public License
 # along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
 
-import copy
+import logging
 
-try:
-    from lisp.plugins.midi.midi_utils import midi_dict_to_str
-except ImportError:
-    midi_dict_to_str = None
+from ..midi_codec import encode_midi
 
 
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
 # If None, then it needs to be translated from FREE
 MESSAGE_TYPE_MAPPING = {
     "CC": "control_change",
@@ -56,19 +55,16 @@ class ControlCueImporter:
     lisp_cuetype = "MidiCue"
     scs_subtype = "M"
 
-    def __init__(self):
-        print("Control cue importer init")
-
     def import_cue(self, importer, scs_cue, scs_subcue):
         # @todo: Check that this is actually a MIDI message
         #control_type = importer.get_string_value(scs_subcue, "")
 
         cue_dict = importer.build_generic_cue(scs_cue, scs_subcue)
 
-        for message in scs_subcue.getElementsByTagName("ControlMessage"):
+        for message in scs_subcue.subrecords("ControlMessage"):
             scs_type = importer.get_string_value(message, "MSMsgType")
             if scs_type not in MESSAGE_TYPE_MAPPING:
-                print(f"SCS Midi Message {scs_type} needs support")
+                logger.warning(f"SCS Midi Message {scs_type} needs support")
                 continue
 
             lisp_midi = {
@@ -95,7 +91,7 @@ class ControlCueImporter:
                     lisp_midi["channel"] = int(data[1:2], 16)
 
                 if msg_type not in MESSAGE_FREE_MAPPING:
-                    print(f"SCS MIDI FREE needs supporting :: {data}")
+                    logger.warning(f"SCS MIDI FREE needs supporting :: {data}")
                     continue
 
                 lisp_midi["type"] = MESSAGE_FREE_MAPPING[msg_type]
@@ -111,6 +107,4 @@ class ControlCueImporter:
                 elif msg_type == "F3":
                     lisp_midi["song"] = int(data[2:4], 16)
 
-            message_dict = copy.deepcopy(cue_dict)
-            message_dict["message"] = midi_dict_to_str(lisp_midi)
-            yield message_dict
+            yield {**cue_dict, "message": encode_midi(lisp_midi)}
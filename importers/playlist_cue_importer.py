@@ -20,8 +20,6 @@
 # You should have received a copy of the GNU General Public License
 # along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
 
-import copy
-
 
 class PlaylistCueImporter:
 
@@ -29,15 +27,11 @@ class PlaylistCueImporter:
     lisp_cuetype = "GstMediaCue"
     scs_subtype = "P"
 
-    def __init__(self):
-        print("Playlist cue importer init")
-
     def import_cue(self, importer, scs_cue, scs_subcue):
         master_level = importer.get_linear_from_db_value(scs_subcue, "PLMastDBLevel0")
         cue_dict = importer.build_generic_cue(scs_cue, scs_subcue)
 
-        for entry in scs_subcue.getElementsByTagName("Sub"):
-            entry_dict = copy.deepcopy(cue_dict)
+        for entry in scs_subcue.subrecords("Sub"):
             elements = {}
             pipeline = []
 
@@ -60,10 +54,12 @@ class PlaylistCueImporter:
             elements["AudioPan"] = 0
 
             # Sink
-            pipeline.append(get_plugin('GstBackend').Config.get("pipeline")[-1])
+            pipeline.append(importer.context.sink_element)
 
-            entry_dict["media"] = {
-                "elements": elements,
-                "pipe": pipeline,
+            yield {
+                **cue_dict,
+                "media": {
+                    "elements": elements,
+                    "pipe": pipeline,
+                },
             }
-            yield entry_dict
@@ -27,9 +27,6 @@ class VideoCueImporter(MediaCueImporter):
 
     scs_subtype = "A"
 
-    def __init__(self):
-        print("Video cue importer init")
-
     def _build_element_pan(self, importer, scs_subcue):
         return {
             "pan": importer.get_pan_value(scs_subcue, "SubDBPan0")
@@ -27,15 +27,16 @@ from PyQt5.QtWidgets import (
     QAction,
     QFileDialog,
     QMenu,
+    QMessageBox,
 )
 
 # pylint: disable=import-error
 from lisp.core.plugin import Plugin
 from lisp.ui.ui_utils import translate
 
-from .exporter import ScsExporter
-from .importer import ScsImporter
-from .util import SCS_FILE_EXT, SCS_XML_INDENT
+from .timing import timings_from_environment
+from .util import SCS_FILE_EXT
+from .worker import ScsTask
 
 
 logger = logging.getLogger(__name__) # pylint: disable=invalid-name
@@ -64,6 +65,7 @@ class Lisp2Scs(Plugin):
 
         self._exporter = None
         self._importer = None
+        self._task = None
 
         # Append actions to File menu
         file_menu = self.app.window.menuFile
@@ -73,11 +75,31 @@ class Lisp2Scs(Plugin):
         self.import_action.triggered.connect(self.import_showfile)
         self.import_menu.addAction(self.import_action)
 
+        self.import_merge_action = QAction(self.import_menu)
+        self.import_merge_action.triggered.connect(self.merge_showfile)
+        self.import_menu.addAction(self.import_merge_action)
+
+        self.import_range_action = QAction(self.import_menu)
+        self.import_range_action.triggered.connect(self.merge_showfile_range)
+        self.import_menu.addAction(self.import_range_action)
+
+        self.check_action = QAction(self.import_menu)
+        self.check_action.triggered.connect(self.check_showfile)
+        self.import_menu.addAction(self.check_action)
+
         self.export_menu = QMenu(file_menu)
         self.export_action = QAction(self.export_menu)
         self.export_action.triggered.connect(self.export_showfile)
         self.export_menu.addAction(self.export_action)
 
+        self.export_packaged_action = QAction(self.export_menu)
+        self.export_packaged_action.triggered.connect(self.export_packaged_showfile)
+        self.export_menu.addAction(self.export_packaged_action)
+
+        self.export_selected_action = QAction(self.export_menu)
+        self.export_selected_action.triggered.connect(self.export_selected_showfile)
+        self.export_menu.addAction(self.export_selected_action)
+
         file_menu.insertMenu(self.app.window.editPreferences, self.import_menu)
         file_menu.insertMenu(self.app.window.editPreferences, self.export_menu)
         file_menu.insertSeparator(self.app.window.editPreferences)
@@ -89,25 +111,103 @@ class Lisp2Scs(Plugin):
             return self.app.session.dir()
         return self.app.conf.get("session.lastPath", os.getenv("HOME"))
 
+    # The importer and exporter (and all they depend on) are only loaded when
+    # first used, so that the plugin adds nothing to LiSP's startup.
+
+    def _load_exporter(self):
+        if self._exporter is None:
+            # pylint: disable=import-outside-toplevel
+            from .exporter import ScsExporter
+            self._exporter = ScsExporter(self.app, timings_from_environment())
+
+    def _load_importer(self):
+        if self._importer is None:
+            # pylint: disable=import-outside-toplevel
+            from .cache import ShowfileCache
+            from .importer import ScsImporter
+            self._importer = ScsImporter(
+                self.app, timings_from_environment(), ShowfileCache())
+
+    def _run_task(self, label, task, on_complete):
+        """Runs the given task on a worker thread, showing its progress."""
+        self._task = ScsTask(self.app.window, label, task, on_complete)
+        self._task.start()
+
+    def _task_running(self):
+        try:
+            return self._task is not None and self._task.is_running()
+        except RuntimeError:
+            # The underlying Qt object has already been deleted
+            return False
+
     def retranslateUi(self):
         self.export_menu.setTitle(translate("Lisp2Scs", "Export"))
         self.export_action.setText(translate("Lisp2Scs", "Show Cue Systems"))
+        self.export_packaged_action.setText(
+            translate("Lisp2Scs", "Show Cue Systems, with media files"))
+        self.export_selected_action.setText(
+            translate("Lisp2Scs", "Show Cue Systems, selected cues only"))
 
         self.import_menu.setTitle(translate("Lisp2Scs", "Import"))
         self.import_action.setText(translate("Lisp2Scs", "Show Cue Systems"))
+        self.import_merge_action.setText(
+            translate("Lisp2Scs", "Show Cue Systems, into the current session"))
+        self.import_range_action.setText(
+            translate("Lisp2Scs", "Show Cue Systems, a range of cues into the current session..."))
+        self.check_action.setText(
+            translate("Lisp2Scs", "Check a Show Cue Systems showfile..."))
+
+    def export_packaged_showfile(self):
+        """Exports a showfile, with copies of all the media it uses alongside."""
+        self._export(package=True)
+
+    def export_selected_showfile(self):
+        """Exports a showfile of only the selected cues, such as one act of a show."""
+        self._export(package=False, selected=True)
 
     def export_showfile(self):
-        filename = self.get_export_filename()
-        if not filename:
+        self._export(package=False)
+
+    def _export(self, package, selected=False):
+        if self._task_running():
             return
 
-        if not self._exporter:
-            self._exporter = ScsExporter(self.app)
+        if selected:
+            cues = sorted(self.app.layout.selected_cues(), key=lambda cue: cue.index)
+            if not cues:
+                logger.warning("No cues are selected to export.")
+                return
+        else:
+            cues = self.app.layout.cues()
 
-        document = self._exporter.export(self._prod_id, self.app.layout.cues())
+        filename = self.get_export_filename()
+        if not filename:
+            return
 
-        with open(filename, mode="w", encoding="utf-8") as file:
-            file.write(document.toprettyxml(indent=SCS_XML_INDENT))
+        self._load_exporter()
+        snapshot = self._exporter.snapshot(cues)
+        prod_id = self._prod_id
+
+        def write(report_progress):
+            if package:
+                self._exporter.package_media(
+                    snapshot, os.path.dirname(filename), report_progress=report_progress)
+
+            # Write to a temporary file first, so a cancelled or failed
+            # export doesn't leave a partially written showfile behind.
+            partial_filename = f"{filename}.part"
+            try:
+                with open(partial_filename, mode="w", encoding="utf-8") as file:
+                    self._exporter.export(prod_id, snapshot, file, report_progress)
+                os.replace(partial_filename, filename)
+            finally:
+                if os.path.exists(partial_filename):
+                    os.remove(partial_filename)
+
+        self._run_task(
+            translate("Lisp2Scs", "Exporting to Show Cue Systems..."),
+            write,
+            lambda _: logger.info(f"Exported to {filename}"))
 
     def get_export_filename(self):
         path, _ = QFileDialog.getSaveFileName(
@@ -136,6 +236,9 @@ class Lisp2Scs(Plugin):
         return None
 
     def import_showfile(self):
+        if self._task_running():
+            return
+
         if not self.app.window.check_session_saved():
             return
 
@@ -143,21 +246,168 @@ class Lisp2Scs(Plugin):
         if not filename:
             return
 
-        if not self._importer:
-            self._importer = ScsImporter(self.app)
+        self._import(filename, self._finish_import)
 
-        with open(filename, mode="r", encoding="utf-8") as file_contents:
-            validated = self._importer.validate_file(file_contents)
-            if not validated:
-                logger.error("Imported file failed validation. See error log for details.")
-                return
+    def merge_showfile(self):
+        """Imports a showfile's cues into the current session, after the selected cue(s)."""
+        if self._task_running():
+            return
+
+        filename = self.get_import_filename()
+        if not filename:
+            return
+
+        position = self._merge_position()
+        self._import(filename, lambda showfile: self._finish_merge(showfile, position))
+
+    def merge_showfile_range(self):
+        """Imports a range of a showfile's cues into the current session, after the selected cue(s)."""
+        if self._task_running():
+            return
+
+        filename = self.get_import_filename()
+        if not filename:
+            return
+
+        # pylint: disable=import-outside-toplevel
+        from .showfile import index_cue_elements
+
+        def index(report_progress):
+            # In KiB, as progress is reported in ints
+            total = os.path.getsize(filename) // 1024
+            with open(filename, mode="rb") as file_contents:
+                return index_cue_elements(
+                    file_contents, lambda done: report_progress(done // 1024, total))
+
+        self._run_task(
+            translate("Lisp2Scs", "Reading Show Cue Systems showfile..."),
+            index,
+            lambda offsets: self._choose_range(filename, offsets))
+
+    def _choose_range(self, filename, offsets):
+        if not offsets:
+            logger.warning(f"No cues were found in {filename}.")
+            return
+
+        # pylint: disable=import-outside-toplevel
+        from .range_dialog import ScsCueRangeDialog
+
+        dialog = ScsCueRangeDialog(offsets, parent=self.app.window)
+        if not dialog.exec():
+            return
+
+        position = self._merge_position()
+        self._import(
+            filename,
+            lambda showfile: self._finish_merge(showfile, position),
+            dialog.selection())
+
+    def check_showfile(self):
+        """Reports whether a showfile may be imported, without importing it."""
+        if self._task_running():
+            return
+
+        filename = self.get_import_filename()
+        if not filename:
+            return
+
+        self._load_importer()
+
+        def prescan(_):
+            with open(filename, mode="rb") as file_contents:
+                return self._importer.prescan_file(file_contents)
+
+        self._run_task(
+            translate("Lisp2Scs", "Checking Show Cue Systems showfile..."),
+            prescan,
+            lambda prescan: self._report_prescan(filename, prescan))
+
+    def _report_prescan(self, filename, prescan):
+        lines = [
+            translate("Lisp2Scs", "Cues: {}").format(prescan.cue_count),
+            translate("Lisp2Scs", "Media files: {}").format(len(prescan.media_files)),
+        ]
+        unsupported = sorted(subtype for subtype, ok in prescan.subtypes.items() if not ok)
+        if unsupported:
+            lines.append(
+                translate("Lisp2Scs", "Unsupported SubTypes: {}").format(", ".join(unsupported)))
+        if prescan.error:
+            lines.append(translate("Lisp2Scs", "Malformed file: {}").format(prescan.error))
+
+        if prescan.passed:
+            summary = translate("Lisp2Scs", "{} may be imported.")
+            show_message = QMessageBox.information
+        else:
+            summary = translate("Lisp2Scs", "{} can not be imported.")
+            show_message = QMessageBox.warning
+
+        lines.insert(0, summary.format(os.path.basename(filename)))
+        show_message(self.app.window, self.check_action.text(), "\n".join(lines))
+
+    def _merge_position(self):
+        selected = [cue.index for cue in self.app.layout.selected_cues()]
+        return max(selected) + 1 if selected else None
+
+    def _import(self, filename, on_complete, selection=None):
+        self._load_importer()
+
+        def parse(report_progress):
+            with open(filename, mode="rb") as file_contents:
+                return self._importer.parse_file(
+                    file_contents, os.path.dirname(filename), report_progress,
+                    selection=selection)
+
+        self._run_task(
+            translate("Lisp2Scs", "Importing from Show Cue Systems..."),
+            parse,
+            on_complete)
+
+    def _confirm_missing_media(self, showfile):
+        """Lists any media files that could not be found, asking whether to import regardless."""
+        if not showfile.missing_media:
+            return True
+
+        message = QMessageBox(self.app.window)
+        message.setIcon(QMessageBox.Warning)
+        message.setWindowTitle(translate("Lisp2Scs", "Show Cue Systems"))
+        message.setText(
+            translate(
+                "Lisp2Scs",
+                "{} media file(s) referred to by the showfile could not be found. "
+                "Import the showfile anyway?"
+            ).format(len(showfile.missing_media)))
+        message.setDetailedText("\n".join(showfile.missing_media))
+        message.setStandardButtons(QMessageBox.Yes | QMessageBox.Cancel)
+        message.setDefaultButton(QMessageBox.Cancel)
+
+        if message.exec() != QMessageBox.Yes:
+            logger.info("Import cancelled, as media files could not be found.")
+            return False
+        return True
+
+    def _finish_merge(self, showfile, position):
+        if not self._importer.validate_file(showfile):
+            logger.error("Imported file failed validation. See error log for details.")
+            return
+
+        if not self._confirm_missing_media(showfile):
+            return
+
+        count = self._importer.merge_file(showfile, position)
+        logger.info(f"Added {count} cue(s) to the current session.")
+
+    def _finish_import(self, showfile):
+        if not self._importer.validate_file(showfile):
+            logger.error("Imported file failed validation. See error log for details.")
+            return
+
+        if not self._confirm_missing_media(showfile):
+            return
 
         self.app.create_session("ListLayout")
         if hasattr(self.app, "session_initialised"):
             self.app.session_initialised.emit(self.app.session)
 
-        with open(filename, mode="r", encoding="utf-8") as file_contents:
-            file_path = os.path.dirname(filename)
-            self._importer.import_file(file_contents, file_path)
+        self._importer.import_file(showfile)
 
         self.app.session_loaded.emit(self.app.session)
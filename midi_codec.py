@@ -0,0 +1,38 @@
+
+# pylint: disable=import-error
+try:
+    from lisp.plugins.midi.midi_utils import midi_dict_to_str, midi_str_to_dict
+except ImportError:
+    midi_dict_to_str = None
+    midi_str_to_dict = None
+
+from .cache import LruCache
+
+
+# How many distinct MIDI messages are remembered, in each direction.
+MIDI_CODEC_CACHE_SIZE = 1024
+
+# Shows tend to use the same few messages over and over, so each is only
+# converted the first time it's met.
+_decoded = LruCache(MIDI_CODEC_CACHE_SIZE)
+_encoded = LruCache(MIDI_CODEC_CACHE_SIZE)
+
+
+def decode_midi(message):
+    """Converts a MIDI message from the string LiSP saves it as, to a dict."""
+    decoded = _decoded.get(message)
+    if decoded is None:
+        decoded = midi_str_to_dict(message)
+        _decoded.put(message, decoded)
+    # A copy, so the remembered dict can't be changed by the caller
+    return dict(decoded)
+
+
+def encode_midi(message_dict):
+    """Converts a MIDI message from a dict, to the string LiSP saves it as."""
+    key = tuple(sorted(message_dict.items()))
+    encoded = _encoded.get(key)
+    if encoded is None:
+        encoded = midi_dict_to_str(message_dict)
+        _encoded.put(key, encoded)
+    return encoded
@@ -0,0 +1,105 @@
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import logging
+import os
+import shutil
+
+
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
+COPY_WORKERS = 4
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _file_digest(path):
+    digest = hashlib.blake2b()
+    with open(path, mode="rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def files_identical(source, destination):
+    """Whether two files have the same content, comparing sizes before hashing."""
+    try:
+        if os.path.getsize(source) != os.path.getsize(destination):
+            return False
+    except OSError:
+        return False
+    return _file_digest(source) == _file_digest(destination)
+
+
+class MediaPackager:
+    """Gathers the media files of a show into a single folder, beside its showfile.
+
+    Each source file is copied only once, however many cues use it. Files
+    with the same name from different folders are given distinct names.
+    """
+
+    def __init__(self, target_dir, link=False):
+        self._target_dir = target_dir
+        self._link = link
+        self._names = {}
+        self._taken = set()
+
+    def add(self, source_path):
+        """Adds a file to the package, returning its name within the package."""
+        key = os.path.realpath(source_path)
+        if key in self._names:
+            return self._names[key]
+
+        stem, ext = os.path.splitext(os.path.basename(source_path))
+        name = stem + ext
+        count = 2
+        # SCS runs on Windows, so names must differ by more than their case
+        while name.lower() in self._taken:
+            name = f"{stem} ({count}){ext}"
+            count += 1
+
+        self._names[key] = name
+        self._taken.add(name.lower())
+        return name
+
+    def _copy(self, source, name):
+        destination = os.path.join(self._target_dir, name)
+        if os.path.realpath(destination) == source:
+            return
+        if not os.path.isfile(source):
+            logger.warning(f"Unable to package {source} as it can not be found.")
+            return
+        if files_identical(source, destination):
+            return
+
+        partial_destination = f"{destination}.part"
+        if self._link:
+            try:
+                os.link(source, partial_destination)
+                os.replace(partial_destination, destination)
+                return
+            except OSError:
+                # Perhaps on a different filesystem; fall back to copying
+                pass
+
+        try:
+            shutil.copy2(source, partial_destination)
+            os.replace(partial_destination, destination)
+        finally:
+            if os.path.exists(partial_destination):
+                os.remove(partial_destination)
+
+    def copy_all(self, report_progress=None):
+        """Copies (or links) every file added into the package folder."""
+        os.makedirs(self._target_dir, exist_ok=True)
+
+        total = len(self._names)
+        pool = ThreadPoolExecutor(max_workers=COPY_WORKERS)
+        try:
+            futures = [pool.submit(self._copy, source, name) for source, name in self._names.items()]
+            for done, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                if report_progress:
+                    report_progress(done, total)
+        finally:
+            # Should a copy fail, or the user cancel, don't start any more
+            pool.shutdown(cancel_futures=True)
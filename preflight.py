@@ -0,0 +1,62 @@
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from .util import SCS_FILE_REL_PREFIX
+
+
+RESOLVE_WORKERS = min(16, (os.cpu_count() or 1) + 4)
+
+
+class MediaResolver:
+    """Finds the media files an SCS showfile refers to, relative to where it was loaded from.
+
+    SCS runs on Windows, where file names are case-insensitive, so a file
+    that can't be found as named is looked for again regardless of case.
+    Directory listings are cached, so that each directory is only read once
+    however many files within it need looking for.
+    """
+
+    def __init__(self, base_dir):
+        self._base_dir = base_dir
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def _list_dir(self, dir_path):
+        with self._lock:
+            if dir_path in self._listings:
+                return self._listings[dir_path]
+
+        try:
+            listing = {entry.lower(): entry for entry in os.listdir(dir_path)}
+        except OSError:
+            listing = None
+
+        with self._lock:
+            self._listings[dir_path] = listing
+        return listing
+
+    def _resolve(self, scs_path):
+        relative_path = scs_path.replace(SCS_FILE_REL_PREFIX, '', 1).replace('\\', '/')
+        path = os.path.join(self._base_dir, relative_path)
+        if os.path.isfile(path):
+            return path
+
+        # Try again, matching each part of the path regardless of case
+        path = self._base_dir
+        for part in relative_path.split('/'):
+            if not part:
+                continue
+            listing = self._list_dir(path)
+            if not listing or part.lower() not in listing:
+                return None
+            path = os.path.join(path, listing[part.lower()])
+
+        return path if os.path.isfile(path) else None
+
+    def resolve_all(self, scs_paths):
+        """Returns the local path of each of the given SCS paths, or None if not found."""
+        scs_paths = list(dict.fromkeys(scs_paths))
+        with ThreadPoolExecutor(max_workers=RESOLVE_WORKERS) as pool:
+            return dict(zip(scs_paths, pool.map(self._resolve, scs_paths)))
@@ -0,0 +1,148 @@
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import threading
+import wave
+
+try:
+    import gi
+    gi.require_version("Gst", "1.0")
+    gi.require_version("GstPbutils", "1.0")
+    from gi.repository import Gst, GstPbutils
+except (ImportError, ValueError):
+    Gst = None
+    GstPbutils = None
+
+from .util import user_cache_dir
+
+
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
+# Channel count, and duration in milliseconds, of a media file.
+MediaInfo = namedtuple('MediaInfo', ['channels', 'duration'])
+
+PROBE_CACHE_FILE = "media_probe.json"
+PROBE_CACHE_SIZE = 20000
+PROBE_TIMEOUT = 10 # seconds
+PROBE_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+
+def _probe_wave(path):
+    with wave.open(path, "rb") as file:
+        return MediaInfo(
+            channels=file.getnchannels(),
+            duration=file.getnframes() * 1000 // file.getframerate(),
+        )
+
+
+_discoverers = threading.local()
+
+
+def _probe_discoverer(path):
+    # Discoverers aren't to be shared between threads, so each gets its own
+    discoverer = getattr(_discoverers, "discoverer", None)
+    if discoverer is None:
+        discoverer = GstPbutils.Discoverer.new(PROBE_TIMEOUT * Gst.SECOND)
+        _discoverers.discoverer = discoverer
+
+    info = discoverer.discover_uri(Gst.filename_to_uri(path))
+    audio_streams = info.get_audio_streams()
+    return MediaInfo(
+        channels=max((stream.get_channels() for stream in audio_streams), default=0),
+        duration=info.get_duration() // Gst.MSECOND,
+    )
+
+
+def probe_file(path):
+    """Reads the channel count and duration of a media file.
+
+    Returns None if the file can not be read.
+    """
+    try:
+        if path.lower().endswith(".wav"):
+            try:
+                return _probe_wave(path)
+            except wave.Error:
+                # Not a format the wave module understands (e.g. floating point)
+                pass
+
+        if GstPbutils is not None and Gst.is_initialized():
+            return _probe_discoverer(path)
+
+    except Exception as exception: # pylint: disable=broad-except
+        logger.warning(f"Unable to read details of {path}: {exception}")
+
+    return None
+
+
+class MediaProber:
+    """Probes media files in parallel, remembering the results between sessions.
+
+    Results are keyed by path, and are only reused whilst the file's
+    modification time and size are unchanged.
+    """
+
+    def __init__(self, cache_path=None):
+        self._cache_path = cache_path or os.path.join(user_cache_dir(), PROBE_CACHE_FILE)
+        self._cache = None
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self._cache_path, mode="r", encoding="utf-8") as file:
+                self._cache = json.load(file)
+        except (OSError, ValueError):
+            self._cache = {}
+
+    def _probe(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return MediaInfo(*cached[2:])
+
+        info = probe_file(path)
+        if info is not None:
+            with self._lock:
+                # Re-inserted, so that the most recently probed are kept when trimming
+                self._cache.pop(path, None)
+                self._cache[path] = [stat.st_mtime_ns, stat.st_size, *info]
+                self._changed = True
+        return info
+
+    def _save(self):
+        # Keep only the most recently probed files
+        entries = list(self._cache.items())[-PROBE_CACHE_SIZE:]
+        partial_path = f"{self._cache_path}.{os.getpid()}.part"
+        try:
+            os.makedirs(os.path.dirname(self._cache_path), exist_ok=True)
+            with open(partial_path, mode="w", encoding="utf-8") as file:
+                json.dump(dict(entries), file)
+            os.replace(partial_path, self._cache_path)
+            self._changed = False
+        except OSError as exception:
+            logger.warning(f"Unable to save media details to {self._cache_path}: {exception}")
+
+    def probe_all(self, paths):
+        """Returns the MediaInfo (or None) of each of the given paths."""
+        if self._cache is None:
+            self._load()
+
+        if Gst is not None:
+            Gst.init_check(None)
+
+        paths = list(dict.fromkeys(paths))
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+            results = dict(zip(paths, pool.map(self._probe, paths)))
+
+        if self._changed:
+            self._save()
+        return results
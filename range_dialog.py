@@ -0,0 +1,74 @@
+# This file is a derivation of work on - and as such shares the same
+# licence as - Linux Show Player
+#
+# Linux Show Player:
+#   Copyright 2012-2023 Francesco Ceruti <ceppofrancy@gmail.com>
+#
+# This file:
+#   Copyright 2023 s0600204
+#
+# Linux Show Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Linux Show Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from PyQt5.QtWidgets import (
+    QComboBox,
+    QDialog,
+    QDialogButtonBox,
+    QFormLayout,
+)
+
+# pylint: disable=import-error
+from lisp.ui.ui_utils import translate
+
+
+class ScsCueRangeDialog(QDialog):
+    """Asks which range of an SCS showfile's cues to import."""
+
+    def __init__(self, offsets, parent=None):
+        super().__init__(parent)
+        self._offsets = offsets
+
+        self.setWindowTitle(translate("Lisp2Scs", "Import a range of cues"))
+        self.setLayout(QFormLayout())
+
+        self.first_cue = QComboBox(self)
+        self.last_cue = QComboBox(self)
+        for position, offset in enumerate(offsets, start=1):
+            label = offset.cue_id or translate("Lisp2Scs", "(cue {})").format(position)
+            self.first_cue.addItem(label)
+            self.last_cue.addItem(label)
+        self.last_cue.setCurrentIndex(len(offsets) - 1)
+
+        self.first_cue.currentIndexChanged.connect(self._first_changed)
+        self.last_cue.currentIndexChanged.connect(self._last_changed)
+
+        self.layout().addRow(translate("Lisp2Scs", "From CueID"), self.first_cue)
+        self.layout().addRow(translate("Lisp2Scs", "To CueID"), self.last_cue)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        self.layout().addRow(buttons)
+
+    def _first_changed(self, index):
+        if self.last_cue.currentIndex() < index:
+            self.last_cue.setCurrentIndex(index)
+
+    def _last_changed(self, index):
+        if self.first_cue.currentIndex() > index:
+            self.first_cue.setCurrentIndex(index)
+
+    def selection(self):
+        """The offsets of the chosen cues."""
+        return self._offsets[self.first_cue.currentIndex():self.last_cue.currentIndex() + 1]
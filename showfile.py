@@ -0,0 +1,269 @@
+from collections import namedtuple
+from xml.etree.ElementTree import ParseError, fromstring, iterparse
+from xml.sax.saxutils import unescape
+
+
+# Elements of an SCS showfile that describe something in their own right.
+#
+# Other elements with children (such as <AudioFile> or <VideoFile>) only
+# group related fields together; their fields are treated as belonging to
+# the enclosing record.
+SCS_RECORD_TAGS = ("Cue", "Sub", "ControlMessage")
+
+# How much of a showfile to read at a time when scanning through it.
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# Where a <Cue> element lies within a showfile (in bytes), and its CueID.
+ScsCueOffset = namedtuple('ScsCueOffset', ['start', 'end', 'cue_id'])
+
+
+def count_cue_elements(file_contents):
+    """Counts the <Cue> elements of an SCS showfile, without parsing it.
+
+    This is a quick scan of the raw bytes, intended only for reporting
+    progress. The file is left positioned where it was found.
+    """
+    start = file_contents.tell()
+    needle = b"<Cue>"
+    count = 0
+    tail = b""
+    while True:
+        chunk = file_contents.read(SCAN_CHUNK_SIZE)
+        if not chunk:
+            break
+        chunk = tail + chunk
+        count += chunk.count(needle)
+        # Keep enough of the end of the chunk to catch a tag split across reads
+        tail = chunk[-(len(needle) - 1):]
+    file_contents.seek(start)
+    return count
+
+
+def index_cue_elements(file_contents, report_progress=None):
+    """Finds where each <Cue> element of an SCS showfile is, and its CueID, without parsing it.
+
+    The file is read a chunk at a time, so only the cues within the current
+    chunk are ever held in memory. If given, `report_progress` is called
+    with the number of bytes read so far after each chunk. The file is left
+    positioned where it was found.
+    """
+    base = file_contents.tell()
+    start_tag = b"<Cue>"
+    end_tag = b"</Cue>"
+    offsets = []
+    buffer = b""
+    buffer_offset = base
+    while True:
+        chunk = file_contents.read(SCAN_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+
+        done = 0
+        while True:
+            start = buffer.find(start_tag, done)
+            if start == -1:
+                # Keep enough of the end of the buffer to catch a tag split across reads
+                done = max(done, len(buffer) - (len(start_tag) - 1))
+                break
+            end = buffer.find(end_tag, start)
+            if end == -1:
+                # The rest of this cue is yet to be read
+                done = start
+                break
+            end += len(end_tag)
+
+            cue_id = None
+            id_start = buffer.find(b"<CueID>", start, end)
+            if id_start != -1:
+                id_start += len(b"<CueID>")
+                id_end = buffer.find(b"</CueID>", id_start, end)
+                if id_end != -1:
+                    cue_id = unescape(buffer[id_start:id_end].decode("utf-8"))
+
+            offsets.append(ScsCueOffset(buffer_offset + start, buffer_offset + end, cue_id))
+            done = end
+
+        buffer = buffer[done:]
+        buffer_offset += done
+        if report_progress:
+            report_progress(buffer_offset + len(buffer) - base)
+
+    file_contents.seek(base)
+    return offsets
+
+
+def iter_cue_slices(file_contents, offsets):
+    """Yields the <Cue> element at each of the given offsets, reading nothing else of the file."""
+    for offset in offsets:
+        file_contents.seek(offset.start)
+        yield fromstring(file_contents.read(offset.end - offset.start))
+
+
+def iter_cue_elements(file_contents):
+    """Yields each <Cue> element of an SCS showfile as soon as it has been read.
+
+    Once the caller has finished with it, an element is discarded, so only
+    one cue need ever be held in memory at any one time.
+    """
+    depth = 0
+    root = None
+    for event, element in iterparse(file_contents, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1 and element.tag == "Cue":
+            yield element
+            root.clear()
+
+
+def scan_fields(file_contents, tag_names):
+    """Yields the tag and text of each of the named fields within an SCS showfile, in order.
+
+    A ("Cue", None) pair is also yielded at the end of each <Cue>. Nothing
+    more of the document is kept than the cue being read.
+    """
+    root = None
+    for event, element in iterparse(file_contents, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+
+        if element.tag in tag_names:
+            yield element.tag, element.text or ""
+        elif element.tag == "Cue":
+            yield "Cue", None
+            root.clear()
+
+
+class ScsRecord:
+    """The fields and nested records of a <Cue>, <Sub> or <ControlMessage> element.
+
+    Built once per element, so that a field may be looked up without
+    searching the element's subtree each time.
+    """
+
+    __slots__ = ("tag", "fields", "records")
+
+    def __init__(self, tag, fields, records):
+        self.tag = tag
+        self.fields = fields
+        self.records = records
+
+    @classmethod
+    def from_element(cls, element):
+        fields = {}
+        records = {}
+
+        def collect(parent):
+            for child in parent:
+                if child.tag in SCS_RECORD_TAGS:
+                    records.setdefault(child.tag, []).append(cls.from_element(child))
+                elif len(child):
+                    collect(child)
+                else:
+                    # As with a search of the element, the first occurrence wins
+                    fields.setdefault(child.tag, child.text or "")
+
+        collect(element)
+        return cls(element.tag, fields, records)
+
+    @classmethod
+    def from_data(cls, data):
+        tag, fields, records = data
+        return cls(tag, fields, {
+            record_tag: [cls.from_data(record) for record in tag_records]
+            for record_tag, tag_records in records.items()
+        })
+
+    def to_data(self):
+        """The record as plain tuples, dicts and lists, for passing to another process."""
+        return (self.tag, self.fields, {
+            record_tag: [record.to_data() for record in tag_records]
+            for record_tag, tag_records in self.records.items()
+        })
+
+    def get(self, tag_name):
+        return self.fields.get(tag_name)
+
+    def subrecords(self, tag_name):
+        return self.records.get(tag_name, [])
+
+
+class ScsShowfile:
+    """A parsed SCS showfile.
+
+    The file is parsed exactly once, with the result being shared between
+    validation and import.
+    """
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._cues = []
+        self._subtypes = {}
+        self._media_files = {}
+        self.missing_media = []
+
+    @property
+    def file_path(self):
+        """The directory the showfile was loaded from."""
+        return self._file_path
+
+    @property
+    def media_files(self):
+        """The URI given to each media file referred to, and the path it was given as in the showfile."""
+        return self._media_files
+
+    @property
+    def subtypes(self):
+        """The distinct SubTypes within the showfile, and whether each may be imported."""
+        return self._subtypes
+
+    def add_cue(self, lisp_cuetype, cue_dict):
+        self._cues.append((lisp_cuetype, cue_dict))
+
+    def cues(self):
+        return self._cues
+
+
+class ScsPrescan:
+    """What a quick scan through an SCS showfile found, before any of it is imported."""
+
+    def __init__(self):
+        self.cue_count = 0
+        self.subtypes = {}
+        self.media_files = set()
+        self.error = None
+
+    @property
+    def passed(self):
+        """Whether the showfile may be imported."""
+        return self.error is None and all(self.subtypes.values())
+
+
+def prescan_showfile(file_contents, check_subtype, stop_early=False):
+    """Counts the cues of a showfile, and finds the SubTypes and media files it uses.
+
+    Each distinct SubType is passed to `check_subtype`, to find out whether
+    it may be imported. If `stop_early` is True, the scan ends as soon as
+    one may not, or the file is found to be malformed.
+    """
+    prescan = ScsPrescan()
+    try:
+        for tag, text in scan_fields(file_contents, ("SubType", "FileName")):
+            if tag == "Cue":
+                prescan.cue_count += 1
+            elif tag == "FileName":
+                prescan.media_files.add(text)
+            elif text not in prescan.subtypes:
+                prescan.subtypes[text] = check_subtype(text)
+                if stop_early and not prescan.subtypes[text]:
+                    break
+    except ParseError as exception:
+        prescan.error = str(exception)
+    return prescan
@@ -0,0 +1,148 @@
+"""Opt-in timing of the stages of an import or export.
+
+Enabled by setting the LISP2SCS_TIMINGS environment variable, whereupon a
+summary of each import and export is logged. If LISP2SCS_TIMINGS_JSON is
+also set, each summary is appended to the file it names, one JSON object
+per line, so as to be attachable to bug reports.
+"""
+
+import json
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
+
+class _NullStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullTimings:
+    """Records nothing, so that timing costs next to nothing when not enabled."""
+
+    enabled = False
+
+    def add(self, name, seconds, count=1):
+        pass
+
+    def report(self, operation):
+        pass
+
+    def reset(self):
+        pass
+
+    def stage(self, name, count=1):
+        return _NULL_STAGE
+
+    def timed_iter(self, name, iterable):
+        return iterable
+
+
+class _Stage:
+
+    __slots__ = ("_timings", "_name", "_count", "_start")
+
+    def __init__(self, timings, name, count):
+        self._timings = timings
+        self._name = name
+        self._count = count
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self._timings.add(self._name, time.perf_counter() - self._start, self._count)
+        return False
+
+
+class StageTimings:
+    """Accumulates the wall time spent in, and number of items through, each stage.
+
+    Stage names may be dotted (e.g. "convert.AudioCueImporter") to break a
+    stage down further; the summary then also gives the total for the
+    undotted stage, which should not itself be timed directly.
+    """
+
+    enabled = True
+
+    def __init__(self, json_path=None):
+        self._json_path = json_path
+        self._stages = {}
+
+    def add(self, name, seconds, count=1):
+        stage = self._stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += count
+
+    def reset(self):
+        self._stages = {}
+
+    def stage(self, name, count=1):
+        """A context manager, timing the body as being part of the named stage."""
+        return _Stage(self, name, count)
+
+    def summary(self):
+        summary = {}
+        for name, (seconds, count) in self._stages.items():
+            summary[name] = {"seconds": seconds, "count": count}
+
+            if "." in name:
+                parent = summary.setdefault(name.split(".", 1)[0], {"seconds": 0.0, "count": 0})
+                parent["seconds"] += seconds
+                parent["count"] += count
+        return summary
+
+    def report(self, operation):
+        summary = self.summary()
+        total = sum(stage["seconds"] for name, stage in summary.items() if "." not in name)
+
+        lines = [f"{operation} took {total * 1000:.1f} ms:"]
+        for name, stage in sorted(summary.items()):
+            indent = "    " if "." in name else "  "
+            lines.append(
+                f"{indent}{name}: {stage['seconds'] * 1000:.1f} ms, {stage['count']} items")
+        logger.info("\n".join(lines))
+
+        if self._json_path:
+            record = {
+                "operation": operation,
+                "time": time.time(),
+                "total": total,
+                "stages": summary,
+            }
+            try:
+                with open(self._json_path, mode="a", encoding="utf-8") as file:
+                    file.write(json.dumps(record) + "\n")
+            except OSError as exception:
+                logger.warning(f"Unable to write timings to {self._json_path}: {exception}")
+
+    def timed_iter(self, name, iterable):
+        """Yields from an iterable, timing the production of each item as the named stage."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start, 0)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+
+def timings_from_environment():
+    if not os.environ.get("LISP2SCS_TIMINGS"):
+        return NullTimings()
+    return StageTimings(os.environ.get("LISP2SCS_TIMINGS_JSON"))
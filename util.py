@@ -1,6 +1,10 @@
 
 from collections import namedtuple
 import enum
+import hashlib
+import itertools
+import os
+import string
 
 if not hasattr(enum, 'StrEnum'):
     class StrEnum(enum.Enum):
@@ -23,6 +27,12 @@ ScsAudioDevice = namedtuple('ScsAudioDevice', ['name', 'channels'])
 ScsMidiDevice = namedtuple('ScsMidiDevice', ['name'])
 ScsVideoAudioDevice = namedtuple('ScsVideoAudioDevice', ['name'])
 
+# Everything an export needs from the session, copied on the GUI thread so
+# the export itself may be run on another.
+ScsExportSnapshot = namedtuple(
+    'ScsExportSnapshot',
+    ['title', 'session_dir', 'cues', 'backend', 'midi_output', 'midi_controls'])
+
 SCS_FILE_EXT = '.scs11'
 SCS_FILE_REL_PREFIX = '$(Cue)\\'
 SCS_XML_INDENT = ' ' * 4
@@ -40,10 +50,144 @@ SCS_XML_INDENT = ' ' * 4
 # The following is used as the markup to diffentiate the CueID from the
 # rest of the cue name.
 #
-# It's not perfect, as there's potential issues, such as there being no
-# check to make sure CueIDs are unique when exporting.
+# It's not perfect: nothing stops two cues being given the same CueID. So
+# when exporting, CueIDs are checked for uniqueness (see ScsCueIndex below).
 #
 # If/When LiSP also supports arbitrary cue numbers/ids, then this can
 # be written out.
 CUEID_MARKUP_PREFIX = '[['
 CUEID_MARKUP_SUFFIX = ']] '
+
+
+def split_cue_name(cue_name):
+    """Separates the CueID markup (if any) from the front of a cue name.
+
+    Returns the CueID (or None) and the rest of the name.
+    """
+    if cue_name.startswith(CUEID_MARKUP_PREFIX):
+        cue_name_split = cue_name[len(CUEID_MARKUP_PREFIX):].split(CUEID_MARKUP_SUFFIX, 1)
+        if len(cue_name_split) == 2:
+            if cue_name_split[0].isalnum():
+                return cue_name_split[0], cue_name_split[1]
+            return None, cue_name_split[1]
+    return None, cue_name
+
+
+def markup_cue_id(cue_name):
+    """The text of the CueID markup at the front of a cue name, or None if there is none.
+
+    Unlike `split_cue_name`, the text is returned whatever characters it
+    holds, so that CueIDs such as "Q1.5" may still be told apart.
+    """
+    if cue_name.startswith(CUEID_MARKUP_PREFIX):
+        cue_id, separator, _ = cue_name[len(CUEID_MARKUP_PREFIX):].partition(CUEID_MARKUP_SUFFIX)
+        if separator:
+            return cue_id
+    return None
+
+
+def _cue_id_suffixes():
+    # "a" to "z", then "aa", "ab", and so on
+    for length in itertools.count(1):
+        for letters in itertools.product(string.ascii_lowercase, repeat=length):
+            yield "".join(letters)
+
+
+class ScsCueIndex:
+    """The SCS CueID and name of each cue being exported, worked out once for all of them.
+
+    A cue's CueID is taken from the markup at the front of its name, or
+    failing that, from its position. Where more than one cue has the same
+    CueID, the first keeps it and each of the others is given the first
+    unused CueID made by adding letters to it (e.g. "Q5a"), so the same
+    cues are renumbered the same way each time.
+    """
+
+    def __init__(self, cues):
+        self._entries = {}
+        self.renumbered = []
+
+        split_names = []
+        for cue in cues:
+            cue_id, cue_name = split_cue_name(cue.name)
+            split_names.append((cue, str(cue.index + 1) if cue_id is None else cue_id, cue_name))
+
+        given = {cue_id for _, cue_id, _ in split_names}
+        used = set()
+        for cue, cue_id, cue_name in split_names:
+            if cue_id in used:
+                new_id = next(
+                    cue_id + suffix for suffix in _cue_id_suffixes()
+                    if cue_id + suffix not in given and cue_id + suffix not in used)
+                self.renumbered.append((cue_id, new_id))
+                cue_id = new_id
+
+            used.add(cue_id)
+            # Snapshots are kept until the export is over, so may be keyed by identity
+            self._entries[id(cue)] = (cue_id, cue_name)
+
+    def cue_id(self, cue):
+        return self._entries[id(cue)][0]
+
+    def name(self, cue):
+        return self._entries[id(cue)][1]
+
+
+class ScsCueSnapshot:
+    """The properties of a LiSP cue, as they were when an export began.
+
+    `extras` holds anything an exporter needed to ask of the live cue,
+    rather than being able to read it from the cue's properties.
+    """
+
+    __slots__ = ("properties", "extras")
+
+    def __init__(self, properties, extras=None):
+        self.properties = properties
+        self.extras = extras or {}
+
+    @classmethod
+    def from_cue(cls, lisp_cue):
+        properties = lisp_cue.properties()
+        properties.setdefault("_type_", lisp_cue.__class__.__name__)
+        return cls(properties)
+
+    @property
+    def cuetype(self):
+        return self.properties["_type_"]
+
+    @property
+    def description(self):
+        return self.properties.get("description", "")
+
+    @property
+    def index(self):
+        return self.properties.get("index", -1)
+
+    @property
+    def name(self):
+        return self.properties.get("name", "")
+
+    def fingerprint(self, property_names):
+        """A digest of the named properties, and the extras, of the cue.
+
+        Only the properties that affect a cue's export should be named, so
+        that changing any other (such as its position) doesn't change it.
+        """
+        properties = [self.properties.get(name) for name in property_names]
+        return hashlib.blake2b(
+            repr((properties, self.extras)).encode(), digest_size=16).digest()
+
+    def get(self, name, default=None):
+        return self.properties.get(name, default)
+
+
+def user_cache_dir():
+    """Where this plugin may keep files between sessions."""
+    try:
+        from lisp import app_dirs # pylint: disable=import-outside-toplevel
+        base_dir = app_dirs.user_cache_dir
+    except ImportError:
+        base_dir = os.path.join(
+            os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "LinuxShowPlayer")
+    return os.path.join(base_dir, "lisp2scs")
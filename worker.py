@@ -0,0 +1,111 @@
+# This file is a derivation of work on - and as such shares the same
+# licence as - Linux Show Player
+#
+# Linux Show Player:
+#   Copyright 2012-2023 Francesco Ceruti <ceppofrancy@gmail.com>
+#
+# This file:
+#   Copyright 2023 s0600204
+#
+# Linux Show Player is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Linux Show Player is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Linux Show Player.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from PyQt5.QtCore import QObject, QThread, Qt, pyqtSignal
+from PyQt5.QtWidgets import QProgressDialog
+
+# pylint: disable=import-error
+from lisp.ui.ui_utils import translate
+
+
+logger = logging.getLogger(__name__) # pylint: disable=invalid-name
+
+
+class ScsTaskCancelled(Exception):
+    """Raised within a task when the user has asked for it to be cancelled."""
+
+
+class ScsWorker(QThread):
+    """Runs a task away from the GUI thread.
+
+    The task is called with a single argument: a function it should call
+    with the amount of work done and the total amount of work, each time
+    it makes progress. Should the task have been cancelled, that function
+    raises ScsTaskCancelled.
+    """
+
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, task, parent=None):
+        super().__init__(parent)
+        self._task = task
+        self.result = None
+        self.succeeded = False
+
+    def report_progress(self, done, total):
+        if self.isInterruptionRequested():
+            raise ScsTaskCancelled()
+        self.progress.emit(done, total)
+
+    def run(self):
+        try:
+            self.result = self._task(self.report_progress)
+            self.succeeded = True
+        except ScsTaskCancelled:
+            logger.info("Cancelled by user.")
+        except Exception: # pylint: disable=broad-except
+            logger.exception("Unable to complete task.")
+
+
+class ScsTask(QObject):
+    """Runs a task on a worker thread, whilst showing its progress in a dialog.
+
+    Once the task has successfully completed, `on_complete` is called with
+    its result, back on the GUI thread.
+    """
+
+    def __init__(self, parent, label, task, on_complete):
+        super().__init__(parent)
+        self._on_complete = on_complete
+
+        self._dialog = QProgressDialog(parent)
+        self._dialog.setWindowTitle(translate("Lisp2Scs", "Show Cue Systems"))
+        self._dialog.setLabelText(label)
+        self._dialog.setWindowModality(Qt.WindowModal)
+        self._dialog.setRange(0, 0)
+
+        self._worker = ScsWorker(task, self)
+        self._worker.progress.connect(self._update_progress)
+        self._worker.finished.connect(self._finish)
+        self._dialog.canceled.connect(self._worker.requestInterruption)
+
+    def is_running(self):
+        return self._worker.isRunning()
+
+    def start(self):
+        self._worker.start()
+
+    def _finish(self):
+        self._dialog.canceled.disconnect(self._worker.requestInterruption)
+        self._dialog.reset()
+        self._dialog.deleteLater()
+        self.deleteLater()
+
+        if self._worker.succeeded:
+            self._on_complete(self._worker.result)
+
+    def _update_progress(self, done, total):
+        if self._dialog.maximum() != total:
+            self._dialog.setMaximum(total)
+        self._dialog.setValue(done)
@@ -0,0 +1,79 @@
+
+from .util import SCS_XML_INDENT
+
+
+class ScsElement:
+    """An element of an SCS showfile that contains other elements.
+
+    Elements that contain only text are held as a (tag, text) tuple, as
+    that is all that is needed to write them out.
+    """
+
+    __slots__ = ("tag", "children")
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.children = []
+
+    def appendChild(self, child): # pylint: disable=invalid-name
+        self.children.append(child)
+        return child
+
+
+def escape_text(text):
+    """Escapes text in the same manner as minidom does."""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+class ScsXmlWriter:
+    """Writes an SCS showfile to a text sink, one element at a time.
+
+    The output is identical to that of minidom's `toprettyxml` when given
+    an indent of SCS_XML_INDENT.
+    """
+
+    def __init__(self, sink):
+        self._sink = sink
+        self._root_tag = None
+
+    def start_document(self, root_tag):
+        self._sink.write(f'<?xml version="1.0" ?>\n<{root_tag}>\n')
+        self._root_tag = root_tag
+
+    def end_document(self):
+        self._sink.write(f"</{self._root_tag}>\n")
+
+    def write_element(self, element, depth=1):
+        """Writes out an element, and all it contains.
+
+        By default, the element is written as a child of the document's
+        root element.
+        """
+        self._write(element, SCS_XML_INDENT * depth)
+
+    def _write(self, element, indent):
+        write = self._sink.write
+
+        if isinstance(element, tuple):
+            tag, text = element
+            write(f"{indent}<{tag}>{escape_text(text)}</{tag}>\n")
+            return
+
+        tag = element.tag
+        if not element.children:
+            write(f"{indent}<{tag}/>\n")
+            return
+
+        write(f"{indent}<{tag}>\n")
+        child_indent = indent + SCS_XML_INDENT
+        for child in element.children:
+            self._write(child, child_indent)
+        write(f"{indent}</{tag}>\n")